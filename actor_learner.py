@@ -0,0 +1,240 @@
+import copy
+import multiprocessing
+import queue
+import random
+import numpy as np
+
+from utils import DEBUG_PRINT, DEBUG_ENABLED, SAVE_LOG, FLUSH_LOG
+from user_simulator import UserSimulator
+from error_model_controller import ErrorModelController
+from state_tracker import StateTracker
+from dqn_agent import DQNAgent
+from shared_ring import SharedTransitionRing
+from db_query import merge_cache_stats
+
+# Checked once, so the DEBUG_PRINT calls of this module cost nothing while it is off
+_DEBUG = DEBUG_ENABLED(__name__)
+# The max seconds the learner waits on the queue before reading the rings again
+RING_POLL_INTERVAL = 0.005
+
+
+def run_actor(actor_id, seed, user_goals, database, size_database, constants, transition_queue, weights_queue,
+              stop_event, ring=None):
+    """
+    Runs episodes with a copy of the policy and streams their experiences to the learner, until stop_event is set.
+
+    The policy runs on the numpy backend so actors do not import TensorFlow. Its weights are replaced by the latest
+    weights put on weights_queue before each episode.
+
+    With a ring, the experiences are written into its shared memory rows as they happen and only the episode result
+    goes through transition_queue, in place of the pickled experiences. The query cache stats of the actor's state
+    tracker go with each episode result, the queries of the episodes run here.
+
+    Parameters:
+        actor_id (int)
+        seed (int): Seeds random and numpy.random of this process
+        user_goals (list): User goals loaded from file
+        database (Catalog): The database, its slot values are the dict of the error model controller
+        size_database (Catalog): The size database, same as database
+        constants (dict): Loaded constants in dict
+        transition_queue (multiprocessing.Queue): Gets (actor id, experiences, episode reward, success, cache stats)
+                                                  per episode, experiences is None with a ring
+        weights_queue (multiprocessing.Queue): Gives the weights of the behavior model broadcast by the learner
+        stop_event (multiprocessing.Event)
+        ring (SharedTransitionRing): The ring of this actor, None to send the experiences through transition_queue
+    """
+
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+    # The actor's agent only acts, it needs no memory and gets its weights from the learner
+    actor_constants = copy.deepcopy(constants)
+    actor_constants['agent']['backend'] = 'numpy'
+    actor_constants['agent']['graph_train_step'] = False
+    actor_constants['agent']['load_weights_file_path'] = ''
+    actor_constants['agent']['max_mem_size'] = actor_constants['agent']['batch_size']
+
+    user = UserSimulator(user_goals, actor_constants, database, size_database)
+    emc = ErrorModelController(database, size_database, actor_constants)
+    state_tracker = StateTracker(database, size_database, actor_constants)
+    dqn_agent = DQNAgent(state_tracker.get_state_size(), actor_constants)
+
+    # Spawned processes exit without running atexit, so the buffered log lines are written out here
+    try:
+        while not stop_event.is_set():
+            # Use the latest broadcast weights
+            weights = None
+            while True:
+                try:
+                    weights = weights_queue.get_nowait()
+                except queue.Empty:
+                    break
+            if weights is not None:
+                dqn_agent.beh_model.set_weights(weights)
+
+            # Reset episode
+            state_tracker.reset()
+            user_action = user.reset_train()
+            emc.infuse_error(user_action)
+            state_tracker.update_state_user(user_action)
+            dqn_agent.reset()
+            state = state_tracker.get_state()
+            experiences = []
+            episode_reward = 0
+            done = False
+            while not done:
+                agent_action_index, agent_action = dqn_agent.get_action_train(state)
+                state_tracker.update_state_agent_train(agent_action)
+                user_action, reward, done, success = user.step(agent_action)
+                if not done:
+                    emc.infuse_error(user_action)
+                state_tracker.update_state_user(user_action)
+                next_state = state_tracker.get_state(done)
+                if ring is None:
+                    experiences.append((state, agent_action_index, reward, next_state, done))
+                else:
+                    # Wait for the learner to read while the ring is full
+                    while not ring.put(state, agent_action_index, reward, next_state, done):
+                        if stop_event.wait(0.001):
+                            return
+                episode_reward += reward
+                state = next_state
+
+            if ring is not None:
+                ring.publish()
+                experiences = None
+            # Block while the learner is behind, but stay responsive to stop_event
+            while not stop_event.is_set():
+                try:
+                    transition_queue.put((actor_id, experiences, episode_reward, success,
+                                          state_tracker.db_helper.get_cache_stats()), timeout=1)
+                    break
+                except queue.Full:
+                    continue
+    finally:
+        FLUSH_LOG()
+
+
+class ActorLearner:
+    """Runs episodes in actor processes and feeds their experiences to the learner agent in this process."""
+
+    def __init__(self, num_actors, dqn_agent, user_goals, database, size_database, constants):
+        """
+        The constructor for ActorLearner.
+
+        Parameters:
+            num_actors (int): The number of actor processes
+            dqn_agent (DQNAgent): The learner agent, it owns the memory and trains the behavior model
+            user_goals (list): User goals loaded from file
+            database (Catalog): The database, its slot values are the dict of the error model controller
+            size_database (Catalog): The size database, same as database
+            constants (dict): Loaded constants in dict
+        """
+
+        if num_actors < 1:
+            raise ValueError('Number of actors must be at least 1!')
+        self.num_actors = num_actors
+        self.dqn_agent = dqn_agent
+        self.user_goals = user_goals
+        self.database = database
+        self.size_database = size_database
+        self.constants = constants
+        # spawn, so actors start without the parent's TensorFlow state
+        self.context = multiprocessing.get_context('spawn')
+        # Bounded so that actors cannot run arbitrarily far ahead of the learner
+        self.transition_queue = self.context.Queue(maxsize=4 * num_actors)
+        self.weights_queues = [self.context.Queue() for _ in range(num_actors)]
+        self.stop_event = self.context.Event()
+        # One shared memory ring per actor for its experiences, 0 ring size to pickle them through the queue instead
+        ring_size = constants['run']['actor_ring_size']
+        self.rings = [None] * num_actors
+        if ring_size > 0:
+            self.rings = [SharedTransitionRing(ring_size, dqn_agent.state_size, self.context) for _ in range(num_actors)]
+        self.actors = []
+        # The latest query cache stats sent by each actor
+        self.cache_stats = [None] * num_actors
+
+    def start(self):
+        """Starts the actor processes with the current weights of the learner's behavior model."""
+
+        self.broadcast_weights()
+        seed = random.randrange(2 ** 31)
+        for actor_id in range(self.num_actors):
+            actor = self.context.Process(target=run_actor, args=(
+                actor_id, seed + actor_id, self.user_goals, self.database, self.size_database, self.constants,
+                self.transition_queue, self.weights_queues[actor_id], self.stop_event, self.rings[actor_id]),
+                daemon=True)
+            actor.start()
+            self.actors.append(actor)
+
+    def broadcast_weights(self):
+        """Sends the weights of the learner's behavior model to all actors, replacing weights they have not used."""
+
+        weights = self.dqn_agent.beh_model.get_weights()
+        for weights_queue in self.weights_queues:
+            try:
+                weights_queue.get_nowait()
+            except queue.Empty:
+                pass
+            weights_queue.put(weights)
+
+    def episodes(self):
+        """
+        Yields the result of each episode run by the actors, after adding its experiences to the learner's memory.
+
+        Yields:
+            tuple: The actor id, the episode reward and success
+        """
+
+        use_rings = any(ring is not None for ring in self.rings)
+        while True:
+            if use_rings:
+                # An actor waiting on its full ring sends nothing until its ring is read, so the rings are read on
+                # every pass and the queue is only waited on briefly
+                for ring in self.rings:
+                    ring.drain_into(self.dqn_agent)
+            try:
+                actor_id, experiences, episode_reward, success, cache_stats = self.transition_queue.get(
+                    timeout=RING_POLL_INTERVAL if use_rings else 1)
+            except queue.Empty:
+                for actor in self.actors:
+                    if actor.exitcode is not None:
+                        raise RuntimeError('Actor process exited with code {}'.format(actor.exitcode))
+                continue
+            self.cache_stats[actor_id] = cache_stats
+            if experiences is None:
+                self.rings[actor_id].drain_into(self.dqn_agent)
+            else:
+                for experience in experiences:
+                    self.dqn_agent.add_experience(*experience)
+            if _DEBUG:
+                DEBUG_PRINT("actor: ", actor_id, ", success: ", success)
+            yield actor_id, episode_reward, success
+
+    def get_cache_stats(self):
+        """
+        Returns the query cache statistics of the actors added together, as of their latest episode results.
+
+        Returns:
+            dict: The merged stats dict of each cache, see DBQuery.get_cache_stats
+        """
+
+        return merge_cache_stats([cache_stats for cache_stats in self.cache_stats if cache_stats is not None])
+
+    def stop(self):
+        """Stops and joins the actor processes and frees the rings."""
+
+        self.stop_event.set()
+        # Drain so that actors blocked on a full queue can exit
+        for actor in self.actors:
+            while actor.is_alive():
+                try:
+                    self.transition_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+                actor.join(timeout=0.1)
+        self.actors = []
+        for ring in self.rings:
+            if ring is not None:
+                ring.close()
+        self.rings = [None] * self.num_actors
+        SAVE_LOG("actors stopped", filename='train.log')
@@ -0,0 +1,65 @@
+import queue
+import threading
+
+
+class BatchPrefetcher:
+    """Makes training batches in a background thread, ahead of the optimizer that consumes them."""
+
+    def __init__(self, make_batch, num_batches, max_prefetch):
+        """
+        The constructor for BatchPrefetcher, which starts the thread.
+
+        Parameters:
+            make_batch (callable): Returns the next batch, only ever called from the thread
+            num_batches (int): The number of batches to make
+            max_prefetch (int): The max number of batches made but not yet consumed
+        """
+
+        self.make_batch = make_batch
+        self.num_batches = num_batches
+        self.queue = queue.Queue(maxsize=max_prefetch)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='BatchPrefetcher', daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        # Give up once the consumer stopped, rather than wait on a full queue forever
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            for _ in range(self.num_batches):
+                if not self._put((self.make_batch(), None)):
+                    return
+        except Exception as e:
+            # Raised again in the consumer's thread
+            self._put((None, e))
+
+    def __iter__(self):
+        """
+        Yields the batches in the order they were made, and raises the error of make_batch if it raised.
+
+        Yields:
+            The batches returned by make_batch
+        """
+
+        try:
+            for _ in range(self.num_batches):
+                batch, error = self.queue.get()
+                if error is not None:
+                    raise error
+                yield batch
+        finally:
+            self.close()
+
+    def close(self):
+        """Stops the thread and waits for it to end."""
+
+        self.stopped.set()
+        self.thread.join()
@@ -0,0 +1,109 @@
+import argparse
+import multiprocessing
+import queue
+import time
+import numpy as np
+
+from shared_ring import SharedTransitionRing
+
+
+class _Memory:
+    """Stands in for the learner agent, counts the experiences given to it."""
+
+    def __init__(self):
+        self.count = 0
+
+    def add_experience(self, state, action, reward, next_state, done):
+        self.count += 1
+
+    def add_experiences(self, states, actions, rewards, next_states, dones):
+        self.count += len(actions)
+
+
+def _episode_states(episode_length, state_size):
+    """
+    Returns a distinct array per state of an episode, float64 like StateTracker.get_state returns.
+
+    Like in run_actor, the next state of a step is the same array as the state of the step after it. The arrays are
+    made once and reused by every episode, pickle only shares the repeated objects within one put.
+    """
+
+    return [np.random.randint(0, 2, state_size).astype(np.float64) for _ in range(episode_length + 1)]
+
+
+def _produce_queue(transition_queue, num_episodes, episode_length, state_size):
+    states = _episode_states(episode_length, state_size)
+    for _ in range(num_episodes):
+        experiences = [(states[i], 0, -1, states[i + 1], False) for i in range(episode_length)]
+        transition_queue.put((0, experiences, 0, False))
+
+
+def _produce_ring(transition_queue, ring, num_episodes, episode_length, state_size):
+    states = _episode_states(episode_length, state_size)
+    for _ in range(num_episodes):
+        for i in range(episode_length):
+            while not ring.put(states[i], 0, -1, states[i + 1], False):
+                time.sleep(0.0001)
+        ring.publish()
+        transition_queue.put((0, None, 0, False))
+
+
+def bench(use_ring, num_episodes, episode_length, state_size):
+    """
+    Returns the experiences per second moved from a producer process to this process.
+
+    Parameters:
+        use_ring (bool): True to write the experiences into a shared memory ring, False to pickle them in a queue
+        num_episodes (int)
+        episode_length (int)
+        state_size (int)
+
+    Returns:
+        float
+    """
+
+    context = multiprocessing.get_context('spawn')
+    transition_queue = context.Queue(maxsize=16)
+    memory = _Memory()
+    ring = SharedTransitionRing(4096, state_size, context) if use_ring else None
+    if use_ring:
+        producer = context.Process(target=_produce_ring,
+                                   args=(transition_queue, ring, num_episodes, episode_length, state_size))
+    else:
+        producer = context.Process(target=_produce_queue,
+                                   args=(transition_queue, num_episodes, episode_length, state_size))
+    producer.start()
+    start = None
+    for _ in range(num_episodes):
+        while True:
+            try:
+                _, experiences, _, _ = transition_queue.get(timeout=0.01)
+                break
+            except queue.Empty:
+                if use_ring:
+                    ring.drain_into(memory)
+        if start is None:
+            # Start after the first episode, so the process start up is not timed
+            start = time.perf_counter()
+        if experiences is None:
+            ring.drain_into(memory)
+        else:
+            for experience in experiences:
+                memory.add_experience(*experience)
+    elapsed = time.perf_counter() - start
+    producer.join()
+    if use_ring:
+        ring.close()
+    return (memory.count - episode_length) / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_episodes', dest='num_episodes', type=int, default=2000)
+    parser.add_argument('--episode_length', dest='episode_length', type=int, default=10)
+    parser.add_argument('--state_size', dest='state_size', type=int, default=105)
+    args = parser.parse_args()
+
+    for name, use_ring in (('queue + pickle', False), ('shared memory ring', True)):
+        rate = bench(use_ring, args.num_episodes, args.episode_length, args.state_size)
+        print('{}: {:.0f} experiences/s'.format(name, rate))
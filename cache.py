@@ -0,0 +1,141 @@
+from collections import OrderedDict
+import sys
+
+# The containers whose items are counted by _deep_size
+CONTAINER_TYPES = (list, tuple, dict, set, frozenset)
+
+
+def _deep_size(obj):
+    """Returns the size in bytes of a container and of the containers in it, recursively."""
+
+    if not isinstance(obj, CONTAINER_TYPES):
+        return 0
+    size = sys.getsizeof(obj)
+    items = obj.values() if isinstance(obj, dict) else obj
+    for item in items:
+        size += _deep_size(item)
+    return size
+
+
+class LRUCache:
+    """A bounded least recently used cache that keeps hit, miss and eviction statistics."""
+
+    def __init__(self, max_size):
+        """
+        The constructor for LRUCache.
+
+        Parameters:
+            max_size (int): The max number of entries kept, the least recently used entry is evicted past it.
+                            0 disables the cache
+        """
+
+        if max_size < 0:
+            raise ValueError('Max cache size must be at least 0!')
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # {hashable: int} The size in bytes of each entry, see _entry_size
+        self.entry_sizes = {}
+        # Size in bytes of the stored keys and values, see _entry_size
+        self.memory = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def _entry_size(self, key, value):
+        """
+        Returns the size in bytes of the containers of an entry, down to the row dicts of a list of rows.
+
+        The strings and numbers in them are not counted, they are mostly shared with the catalog vocab and the caller.
+        """
+
+        return _deep_size(key) + _deep_size(value)
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for key and marks it as the most recently used, or default on a miss.
+
+        Parameters:
+            key (hashable)
+            default: Returned when key is not in the cache
+
+        Returns:
+            The stored value or default
+        """
+
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        """
+        Stores value for key, evicting the least recently used entries if the cache is full.
+
+        Parameters:
+            key (hashable)
+            value
+        """
+
+        if self.max_size == 0:
+            return
+        if key in self.entries:
+            self.memory -= self.entry_sizes[key]
+            self.entries.move_to_end(key)
+        self.entries[key] = value
+        self.entry_sizes[key] = self._entry_size(key, value)
+        self.memory += self.entry_sizes[key]
+        while len(self.entries) > self.max_size:
+            old_key, _ = self.entries.popitem(last=False)
+            self.memory -= self.entry_sizes.pop(old_key)
+            self.evictions += 1
+
+    def clear(self):
+        """Empties the cache, the statistics are kept."""
+
+        self.entries.clear()
+        self.entry_sizes.clear()
+        self.memory = 0
+
+    def hit_rate(self):
+        """Returns the fraction of lookups that were hits."""
+
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        """
+        Returns the statistics of the cache.
+
+        Returns:
+            dict: size, max_size, hits, misses, hit_rate, evictions and memory (bytes of the containers of the entries)
+        """
+
+        return {'size': len(self.entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hit_rate(), 'evictions': self.evictions, 'memory': self.memory}
+
+
+
+def merge_stats(stats_list):
+    """
+    Returns the statistics of several caches added together, like the stats of one cache holding all their entries.
+
+    Parameters:
+        stats_list (list): The stats dicts of the caches, see LRUCache.stats
+
+    Returns:
+        dict: size, max_size, hits, misses, hit_rate, evictions and memory
+    """
+
+    merged = {key: sum(stats[key] for stats in stats_list)
+              for key in ('size', 'max_size', 'hits', 'misses', 'evictions', 'memory')}
+    lookups = merged['hits'] + merged['misses']
+    merged['hit_rate'] = merged['hits'] / lookups if lookups else 0.0
+    return merged
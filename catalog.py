@@ -0,0 +1,214 @@
+import sys
+import numpy as np
+
+
+def _code_dtype(vocab_size):
+    """Returns the smallest signed integer dtype that holds the codes of a vocab (and -1 for a missing slot)."""
+
+    for dtype in (np.int8, np.int16, np.int32):
+        if vocab_size <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) == str else value
+
+
+class Catalog:
+    """A columnar, dictionary-encoded database with an inverted index of its (case folded) slot values."""
+
+    def __init__(self, database, slot_values=None):
+        """
+        The constructor for Catalog.
+
+        Each slot becomes an integer column of codes into the list of the distinct values of the slot (-1 where a row
+        does not have the slot). Values are interned and case folded once here, so queries never lower() them again.
+
+        Parameters:
+            database (list): The database in the format list(dict)
+            slot_values (dict): The possible values of each slot with format dict(string: list), as in the dict
+                                files. Default: the distinct values of each slot in the database
+        """
+
+        self.num_rows = len(database)
+        # The slots in order of first appearance, which is the key order of the rows
+        self.slots = []
+        # {string: list} The distinct values of each slot, a code is an index in this list
+        self.vocab = {}
+        # {string: numpy.array} The code of the value of each row
+        self.columns = {}
+        # {(string, string): numpy.array} The sorted ids of the rows of each (slot, case folded value)
+        self.postings = {}
+
+        codes = {}
+        for data in database:
+            for key in data.keys():
+                if key not in codes:
+                    self.slots.append(key)
+                    codes[key] = {}
+        for slot in self.slots:
+            slot_codes = codes[slot]
+            column = []
+            for data in database:
+                if slot in data:
+                    value = data[slot]
+                    if value not in slot_codes:
+                        slot_codes[value] = len(slot_codes)
+                    column.append(slot_codes[value])
+                else:
+                    column.append(-1)
+            self.vocab[slot] = [_intern(value) for value in slot_codes]
+            self.columns[slot] = np.array(column, dtype=_code_dtype(len(slot_codes)))
+            self._index_column(slot)
+
+        if slot_values is None:
+            self.slot_values = {slot: list(self.vocab[slot]) for slot in self.slots}
+        else:
+            self.slot_values = {slot: [_intern(value) for value in values] for slot, values in slot_values.items()}
+
+    @classmethod
+    def from_parts(cls, num_rows, slots, vocab, columns, postings, slot_values):
+        """
+        Returns a Catalog made of already encoded parts, such as the ones of a snapshot, without encoding a database.
+
+        Parameters:
+            num_rows (int)
+            slots (list): The slots in order of first appearance
+            vocab (dict): The distinct values of each slot with format dict(string: list)
+            columns (dict): The code of the value of each row of each slot with format dict(string: numpy.array)
+            postings (dict): The sorted row ids of each (slot, case folded value)
+            slot_values (dict): The possible values of each slot with format dict(string: list)
+
+        Returns:
+            Catalog
+        """
+
+        catalog = cls.__new__(cls)
+        catalog.num_rows = num_rows
+        catalog.slots = slots
+        catalog.vocab = vocab
+        catalog.columns = columns
+        catalog.postings = postings
+        catalog.slot_values = slot_values
+        return catalog
+
+    def column_matrix(self):
+        """
+        Returns the columns stacked in the order of the slots, in the smallest dtype that holds the codes of every slot.
+
+        Returns:
+            numpy.array: The codes of shape (number of slots, number of rows)
+        """
+
+        dtype = _code_dtype(max([len(values) for values in self.vocab.values()] + [0]))
+        columns = np.full((len(self.slots), self.num_rows), -1, dtype=dtype)
+        for i, slot in enumerate(self.slots):
+            columns[i] = self.columns[slot]
+        return columns
+
+    def _index_column(self, slot):
+        """Adds the row ids of each case folded value of the slot to the postings."""
+
+        folded_codes = {}
+        fold = np.array([folded_codes.setdefault(str(value).lower(), len(folded_codes))
+                         for value in self.vocab[slot]] + [-1], dtype=np.int64)
+        # -1 (missing slot) maps to the last element, -1
+        folded_column = fold[self.columns[slot]]
+        row_ids = np.flatnonzero(folded_column >= 0)
+        folded_column = folded_column[row_ids]
+        # A stable sort keeps the row ids of each value in ascending order
+        order = np.argsort(folded_column, kind='stable')
+        row_ids = row_ids[order]
+        folded_column = folded_column[order]
+        if not len(row_ids):
+            return
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(folded_column)) + 1))
+        folded_values = list(folded_codes)
+        for start, group in zip(starts, np.split(row_ids, starts[1:])):
+            self.postings[(slot, sys.intern(folded_values[folded_column[start]]))] = group
+
+    def __len__(self):
+        return self.num_rows
+
+    def __iter__(self):
+        for row_id in range(self.num_rows):
+            yield self.row(row_id)
+
+    def __getitem__(self, row_id):
+        return self.row(row_id)
+
+    def row(self, row_id):
+        """
+        Returns a row of the database as a dict.
+
+        Parameters:
+            row_id (int)
+
+        Returns:
+            dict: The row in the same format as the rows of the database
+        """
+
+        if row_id < 0:
+            row_id += self.num_rows
+        data = {}
+        for slot in self.slots:
+            code = self.columns[slot][row_id]
+            if code >= 0:
+                data[slot] = self.vocab[slot][code]
+        return data
+
+    def rows(self, row_ids):
+        """
+        Returns the rows of the database as a list of dicts.
+
+        Parameters:
+            row_ids (iterable): The ids of the rows
+
+        Returns:
+            list: The rows in the given order
+        """
+
+        return [self.row(row_id) for row_id in row_ids]
+
+    def row_ids(self, slot, value):
+        """
+        Returns the ids of the rows holding the value in the slot, compared case insensitively.
+
+        Parameters:
+            slot (string)
+            value
+
+        Returns:
+            numpy.array: The sorted row ids, empty if no row matches
+        """
+
+        return self.postings.get((slot, str(value).lower()), np.empty(0, dtype=np.intp))
+
+    def match_rows(self, constraints):
+        """
+        Returns the ids of the rows holding all of the constraints, compared case insensitively.
+
+        Parameters:
+            constraints (dict): The constraints with format dict(slot: value)
+
+        Returns:
+            numpy.array: The sorted row ids
+        """
+
+        if not constraints:
+            return np.arange(self.num_rows)
+        postings = []
+        for slot, value in constraints.items():
+            row_ids = self.row_ids(slot, value)
+            if not len(row_ids):
+                return row_ids
+            postings.append(row_ids)
+        # Intersect starting from the most selective slot
+        postings.sort(key=len)
+        matches = postings[0]
+        for row_ids in postings[1:]:
+            matches = np.intersect1d(matches, row_ids, assume_unique=True)
+            if not len(matches):
+                break
+        return matches
@@ -0,0 +1,208 @@
+import argparse
+import copy
+import json
+import numpy as np
+
+from dqn_agent import DQNAgent
+from numpy_model import NumpyModel
+
+
+def _make_agent(constants, state_size, weights, target_weights, experiences, td_errors, **agent_options):
+    """
+    Returns an agent with the weights and whose memory holds exactly the experiences.
+
+    Parameters:
+        constants (dict): Loaded constants in dict
+        state_size (int)
+        weights (list): The weights of the behavior model
+        target_weights (list): The weights of the target model, others than weights so that DQN and DDQN differ
+        experiences (tuple): The states, actions, rewards, next_states and dones arrays, whole batches of them
+        td_errors (numpy.array): The TD errors the priorities of the experiences are set from, so that prioritized
+                                 replay does not sample uniformly
+        agent_options: Agent constants to override
+    """
+
+    agent_constants = copy.deepcopy(constants)
+    agent_constants['agent'].update(agent_options, max_mem_size=len(experiences[1]), train_steps=0,
+                                    update_to_data=0, load_weights_file_path='')
+    agent_constants['run']['spread_training'] = False
+    dqn_agent = DQNAgent(state_size, agent_constants)
+    dqn_agent.beh_model.set_weights(weights)
+    dqn_agent.tar_model.set_weights(target_weights)
+    dqn_agent.add_experiences(*experiences)
+    dqn_agent.memory.update_priorities(np.arange(len(td_errors)), td_errors)
+    # The same seed for every agent, so they all sample the same batches
+    dqn_agent.memory.rng = np.random.default_rng(0)
+    return dqn_agent
+
+
+def _train_and_record(dqn_agent):
+    """
+    Runs one train call of the agent.
+
+    Returns:
+        float: The mean of the losses reported by its fit calls, None if it did not call fit
+        list: The indices and the TD errors of each update_priorities call
+    """
+
+    losses = []
+    td_updates = []
+    fit = dqn_agent.beh_model.fit
+    update_priorities = dqn_agent.memory.update_priorities
+
+    def recording_fit(*args, **kwargs):
+        result = fit(*args, **kwargs)
+        # Keras returns a History, NumpyModel the list of its epoch losses
+        losses.extend(result.history['loss'] if hasattr(result, 'history') else result)
+        return result
+
+    def recording_update_priorities(indices, td_errors):
+        td_updates.append((np.asarray(indices), np.asarray(td_errors)))
+        update_priorities(indices, td_errors)
+
+    dqn_agent.beh_model.fit = recording_fit
+    dqn_agent.memory.update_priorities = recording_update_priorities
+    dqn_agent.train()
+    return (float(np.mean(losses)) if losses else None), td_updates
+
+
+def _assert_same_weights(agent, other_agent):
+    for w, other_w in zip(agent.beh_model.get_weights(), other_agent.beh_model.get_weights()):
+        assert np.allclose(w, other_w, rtol=1e-4, atol=1e-6), 'The weights after the train call differ'
+
+
+def check_single_fit(constants, state_size, weights, target_weights, experiences, td_errors, **agent_options):
+    """
+    Checks that a single_fit train call gives the same loss and weights as the per batch path.
+
+    With one batch that holds for any options. With more, it only holds for DQN with uniform replay: the targets of
+    the taken actions only depend on the target model and the other outputs are not trained, so the behavior model
+    changes between the batches do not matter. For DDQN the next actions are picked with the behavior model of the
+    start of the call and with prioritized replay the priorities are only updated after the fit, see
+    check_single_fit_priorities.
+
+    Returns:
+        tuple: The loss of each path
+    """
+
+    agent = _make_agent(constants, state_size, weights, target_weights, experiences, td_errors, single_fit=False,
+                        graph_train_step=False, **agent_options)
+    single_fit_agent = _make_agent(constants, state_size, weights, target_weights, experiences, td_errors,
+                                   single_fit=True, graph_train_step=False, **agent_options)
+    loss, _ = _train_and_record(agent)
+    single_fit_loss, _ = _train_and_record(single_fit_agent)
+    assert np.isclose(loss, single_fit_loss, rtol=1e-5), 'Loss: {} != {}'.format(loss, single_fit_loss)
+    _assert_same_weights(agent, single_fit_agent)
+    return loss, single_fit_loss
+
+
+def check_single_fit_priorities(constants, state_size, weights, target_weights, experiences, td_errors,
+                                **agent_options):
+    """
+    Checks that a single_fit train call with prioritized replay updates the priorities of the sampled experiences
+    after the fit, from the TD errors of the models of the start of the call, as _train_single_fit documents.
+
+    Returns:
+        int: The number of batches
+    """
+
+    agent = _make_agent(constants, state_size, weights, target_weights, experiences, td_errors, single_fit=True,
+                        graph_train_step=False, prioritized_replay=True, **agent_options)
+    beh_model = NumpyModel(agent.state_size, agent.hidden_size, agent.num_actions)
+    beh_model.set_weights(weights)
+    tar_model = NumpyModel(agent.state_size, agent.hidden_size, agent.num_actions)
+    tar_model.set_weights(target_weights)
+    _, td_updates = _train_and_record(agent)
+    assert len(td_updates) > 1, 'Expected several batches'
+    for indices, batch_td_errors in td_updates:
+        expected_td_errors = agent._get_targets(*agent.memory.get_batch(indices), beh_model, tar_model)[1]
+        assert np.allclose(batch_td_errors, expected_td_errors, rtol=1e-4, atol=1e-5), \
+            'The TD errors are not the ones of the start of the call'
+    # The last update of each experience is its priority
+    priorities = {}
+    for indices, batch_td_errors in td_updates:
+        priorities.update(zip(indices, (np.abs(batch_td_errors) + agent.memory.epsilon) ** agent.memory.alpha))
+    indices = np.array(list(priorities))
+    assert np.allclose(agent.memory.tree.get(indices), [priorities[i] for i in indices]), \
+        'The priorities of the sampled experiences were not updated'
+    return len(td_updates)
+
+
+def check_graph_train_step(constants, state_size, weights, target_weights, experiences, td_errors, **agent_options):
+    """
+    Checks that graph_train_step train calls give the same TD errors and weights as _get_targets and fit.
+
+    Needs the keras backend with TensorFlow 2.
+
+    Returns:
+        float: The max difference of the TD errors
+    """
+
+    agent = _make_agent(constants, state_size, weights, target_weights, experiences, td_errors, single_fit=False,
+                        graph_train_step=False, **agent_options)
+    graph_agent = _make_agent(constants, state_size, weights, target_weights, experiences, td_errors,
+                              single_fit=False, graph_train_step=True, **agent_options)
+    _, td_updates = _train_and_record(agent)
+    _, graph_td_updates = _train_and_record(graph_agent)
+    assert len(td_updates) == len(graph_td_updates)
+    max_difference = 0.
+    for (indices, batch_td_errors), (graph_indices, graph_batch_td_errors) in zip(td_updates, graph_td_updates):
+        assert np.array_equal(indices, graph_indices), 'The sampled batches differ'
+        assert np.allclose(batch_td_errors, graph_batch_td_errors, rtol=1e-4, atol=1e-5), 'The TD errors differ'
+        max_difference = max(max_difference, float(np.max(np.abs(batch_td_errors - graph_batch_td_errors))))
+    _assert_same_weights(agent, graph_agent)
+    return max_difference
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--constants_path', dest='constants_path', type=str, default='constants.json')
+    parser.add_argument('--backend', dest='backend', type=str, default='numpy')
+    parser.add_argument('--state_size', dest='state_size', type=int, default=105)
+    args = parser.parse_args()
+
+    with open(args.constants_path) as f:
+        constants = json.load(f)
+    constants['agent']['backend'] = args.backend
+    constants['agent']['load_weights_file_path'] = ''
+    constants['run']['spread_training'] = False
+    batch_size = constants['agent']['batch_size']
+    num_batches = 4
+    rng = np.random.default_rng(0)
+    experiences = (rng.integers(0, 2, (num_batches * batch_size, args.state_size)).astype(np.float32),
+                   rng.integers(0, 16, num_batches * batch_size),
+                   rng.normal(size=num_batches * batch_size).astype(np.float32),
+                   rng.integers(0, 2, (num_batches * batch_size, args.state_size)).astype(np.float32),
+                   rng.random(num_batches * batch_size) < 0.2)
+    td_errors = rng.exponential(size=num_batches * batch_size)
+    batch = tuple(part[:batch_size] for part in experiences)
+    # Two inits, so the target model differs from the behavior model
+    weights = DQNAgent(args.state_size, constants).beh_model.get_weights()
+    target_weights = DQNAgent(args.state_size, constants).beh_model.get_weights()
+
+    for vanilla in (True, False):
+        for prioritized_replay in (False, True):
+            losses = check_single_fit(constants, args.state_size, weights, target_weights, batch,
+                                      td_errors[:batch_size], vanilla=vanilla, prioritized_replay=prioritized_replay)
+            print('single_fit on 1 batch, vanilla={} prioritized_replay={}: loss {:.6f} == {:.6f}'.format(
+                vanilla, prioritized_replay, *losses))
+    losses = check_single_fit(constants, args.state_size, weights, target_weights, experiences, td_errors,
+                              vanilla=True, prioritized_replay=False)
+    print('single_fit on {} batches, vanilla=True prioritized_replay=False: loss {:.6f} == {:.6f}'.format(
+        num_batches, *losses))
+    for vanilla in (True, False):
+        checked_batches = check_single_fit_priorities(constants, args.state_size, weights, target_weights,
+                                                      experiences, td_errors, vanilla=vanilla)
+        print('single_fit on {} batches, vanilla={} prioritized_replay=True: priorities updated after the fit'.format(
+            checked_batches, vanilla))
+
+    if args.backend != 'keras':
+        print('graph_train_step: skipped, it needs --backend keras')
+    else:
+        for vanilla in (True, False):
+            for prioritized_replay in (False, True):
+                max_difference = check_graph_train_step(constants, args.state_size, weights, target_weights,
+                                                        experiences, td_errors, vanilla=vanilla,
+                                                        prioritized_replay=prioritized_replay)
+                print('graph_train_step on {} batches, vanilla={} prioritized_replay={}: max TD error difference '
+                      '{:.2e}'.format(num_batches, vanilla, prioritized_replay, max_difference))
@@ -1,33 +1,123 @@
 from collections import defaultdict
 import copy
 import random
+import numpy as np
 
-from utils import DEBUG_PRINT, SAVE_LOG
+from cache import LRUCache, merge_stats
+from catalog import Catalog
+from utils import DEBUG_PRINT, DEBUG_ENABLED, SAVE_LOG
 from utils import check_match_sublist_and_substring
 from dialogue_config import no_query_keys, usersim_default_key, size_slots
 
+# Checked once, so the DEBUG_PRINT calls of this module cost nothing while it is off
+_DEBUG = DEBUG_ENABLED(__name__)
+
+# Number of set bits of every byte value, to count the rows of a packed bitmask
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
 class DBQuery:
     """Queries the database for the state tracker."""
 
-    def __init__(self, database, size_database):
+    def __init__(self, database, size_database, constants):
         """
         The constructor for DBQuery.
 
         Parameters:
-            database (dict): The database in the format dict(long: dict)
+            database (list or Catalog): The database in the format list(dict)
+            size_database (list or Catalog): The size database in the format list(dict)
+            constants (dict): Loaded constants in dict
         """
 
-        self.database = database
-        self.size_database = size_database
-        # {frozenset: {string: int}} A dict of dicts
-        self.cached_db_slot = defaultdict(dict)
-        self.cached_size_db_slot = defaultdict(dict)
-        # {frozenset: {'#': {'slot': 'value'}}} A dict of dicts of dicts, a dict of DB sub-dicts
-        self.cached_db = defaultdict(list)
-        self.cached_size_db = defaultdict(list)
+        # Columnar catalogs of the databases, built here if plain lists of dicts are given
+        self.database = database if isinstance(database, Catalog) else Catalog(database)
+        self.size_database = size_database if isinstance(size_database, Catalog) else Catalog(size_database)
+        # Bounded LRU caches keyed by the frozenset of the constraint items
+        cache_size = constants['db']['cache_size']
+        # {frozenset: {string: int}} A cache of dicts
+        self.cached_db_slot = LRUCache(cache_size)
+        self.cached_size_db_slot = LRUCache(cache_size)
+        # {frozenset: [{'slot': 'value'}]} A cache of lists of DB sub-dicts, empty when nothing matches
+        self.cached_db = LRUCache(cache_size)
+        self.cached_size_db = LRUCache(cache_size)
         self.no_query = no_query_keys
         self.match_key = usersim_default_key
         self.size_slots = size_slots
+        # {(string, string): numpy.array} Packed row bitmasks of the (slot, value) postings, built on first use
+        self.db_masks = {}
+        self.size_db_masks = {}
+
+    def get_cache_stats(self):
+        """
+        Returns the statistics of the query caches.
+
+        Returns:
+            dict: The stats dict of each cache, see LRUCache.stats
+        """
+
+        return {'db_slot': self.cached_db_slot.stats(), 'size_db_slot': self.cached_size_db_slot.stats(),
+                'db': self.cached_db.stats(), 'size_db': self.cached_size_db.stats()}
+
+    def _get_mask(self, catalog, masks, slot, value):
+        """
+        Returns the packed bitmask of the rows holding a slot value, building and storing it on first use.
+
+        Parameters:
+            catalog (Catalog): The database
+            masks (dict): The stored bitmasks of this database
+            slot (string)
+            value (string)
+
+        Returns:
+            numpy.array: The packed bitmask (uint8) with one bit per row
+        """
+
+        key = (slot, str(value).lower())
+        mask = masks.get(key)
+        if mask is None:
+            bits = np.zeros(catalog.num_rows, dtype=bool)
+            row_ids = catalog.row_ids(slot, value)
+            if not len(row_ids):
+                # Do not store masks of values that are not in the database
+                return np.packbits(bits)
+            bits[row_ids] = True
+            mask = np.packbits(bits)
+            masks[key] = mask
+        return mask
+
+    def _count_slot_matches(self, catalog, masks, current_informs, match_anything_rows=False):
+        """
+        Counts the rows matching each inform slot and the rows matching all of them using the packed bitmasks.
+
+        Parameters:
+            catalog (Catalog): The database
+            masks (dict): The stored bitmasks of this database
+            current_informs (dict): The filtered current informs/constraints
+            match_anything_rows (bool): Whether rows with the value 'anything' match any value of their slot
+
+        Returns:
+            dict: Each key in current_informs with the count of the number of matches for that key
+        """
+
+        db_results_slots = {key: 0.0 for key in current_informs.keys()}
+        all_slots_mask = None
+        for CI_key, CI_value in current_informs.items():
+            # Skip if a no query item and all slots match stays true
+            if CI_key in self.no_query:
+                continue
+            # If anything all slots match stays true AND the specific key slot gets all the rows
+            if CI_value == 'anything':
+                db_results_slots[CI_key] += catalog.num_rows
+                continue
+            mask = self._get_mask(catalog, masks, CI_key, CI_value)
+            if match_anything_rows:
+                mask = mask | self._get_mask(catalog, masks, CI_key, 'anything')
+            db_results_slots[CI_key] += int(POPCOUNT_TABLE[mask].sum())
+            all_slots_mask = mask if all_slots_mask is None else all_slots_mask & mask
+        if all_slots_mask is None:
+            db_results_slots['matching_all_constraints'] = catalog.num_rows
+        else:
+            db_results_slots['matching_all_constraints'] = int(POPCOUNT_TABLE[all_slots_mask].sum())
+        return db_results_slots
 
     def _check_constraints(self, current_requests, db_results, entity_list):
         request_key = current_requests[0] if type(current_requests) == list and current_requests else current_requests
@@ -96,10 +186,12 @@ class DBQuery:
         """
 
         product_db_results_slots = self.get_db_results_for_product_slots(current_informs)
-        DEBUG_PRINT('product_db_results_slots = ', product_db_results_slots)
+        if _DEBUG:
+            DEBUG_PRINT('product_db_results_slots = ', product_db_results_slots)
 
         size_db_results_slots = self.get_db_results_for_size_slots(current_informs)
-        DEBUG_PRINT('size_db_results_slots = ', size_db_results_slots)
+        if _DEBUG:
+            DEBUG_PRINT('size_db_results_slots = ', size_db_results_slots)
 
         # If it made it down here then a new query was made and it must add it to cached_db_slot and return it
         # Init all key values with 0
@@ -159,54 +251,17 @@ class DBQuery:
         # DEBUG_PRINT(inform_items)
 
         # A dict of the inform keys and their counts as stored (or not stored) in the cached_db_slot
-        cache_return = self.cached_db_slot[inform_items]
+        cache_return = self.cached_db_slot.get(inform_items)
         # DEBUG_PRINT(cache_return)
 
-        if cache_return:
+        if cache_return is not None:
             return cache_return
 
         # If it made it down here then a new query was made and it must add it to cached_db_slot and return it
-        # Init all key values with 0
-        # db_results_slots = {key: 0.0 for key in update_current_informs.keys()}
-        db_results_slots = {key: 0.0 for key in new_current_informs.keys()}
-        db_results_slots['matching_all_constraints'] = 0
-
-        # db_results is a dict of dict in the same exact format as the db, it is just a subset of the db
-        # db_results = self._get_db_results(tuple_current_informs)
-        # DEBUG_PRINT("db_results = ", db_results)
-        for data in self.database:
-            all_slots_match = True
-            for CI_key, CI_value in new_current_informs.items():
-                # Skip if a no query item and all_slots_match stays true
-                if CI_key in self.no_query:
-                    continue
-                # If anything all_slots_match stays true AND the specific key slot gets a +1
-                if CI_value == 'anything':
-                    db_results_slots[CI_key] += 1
-                    continue
-                if CI_key in list(data.keys()):
-                    # if CI_key == "amount_product":
-                    #     # DEBUG_PRINT(CI_value)
-                    #     # DEBUG_PRINT(data[CI_key])
-                    #     if CI_value <= data[CI_key]:
-                    #         db_results_slots[CI_key] += 1
-                    # elif check_match_sublist_and_substring(CI_value,data[CI_key]):
-                    #     db_results_slots[CI_key] += 1
-                    if CI_value.lower() == data[CI_key].lower():
-                        db_results_slots[CI_key] += 1
-                    else:
-                        all_slots_match = False
-                else:
-                    all_slots_match = False
-            if all_slots_match: db_results_slots['matching_all_constraints'] += 1
-
-        # not_match = self._check_constraints(current_requests, db_results, entity_list)
-        # if not_match:
-            # db_results_slots['matching_all_constraints'] = 0.0
+        db_results_slots = self._count_slot_matches(self.database, self.db_masks, new_current_informs)
 
-        # update cache (set the empty dict)
-        self.cached_db_slot[inform_items].update(db_results_slots)
-        assert self.cached_db_slot[inform_items] == db_results_slots
+        # update cache
+        self.cached_db_slot.put(inform_items, db_results_slots)
 
         return db_results_slots
 
@@ -236,41 +291,19 @@ class DBQuery:
         # DEBUG_PRINT(inform_items)
 
         # A dict of the inform keys and their counts as stored (or not stored) in the cached_db_slot
-        cache_return = self.cached_size_db_slot[inform_items]
+        cache_return = self.cached_size_db_slot.get(inform_items)
         # DEBUG_PRINT(cache_return)
 
-        if cache_return:
+        if cache_return is not None:
             return cache_return
 
         # If it made it down here then a new query was made and it must add it to cached_db_slot and return it
-        # Init all key values with 0
-        db_results_slots = {key: 0.0 for key in new_current_informs.keys()}
-        db_results_slots['matching_all_constraints'] = 0
-
-        # db_results is a dict of dict in the same exact format as the db, it is just a subset of the db
-        # DEBUG_PRINT("db_results = ", db_results)
-        for data in self.size_database:
-            all_slots_match = True
-            for CI_key, CI_value in new_current_informs.items():
-                # Skip if a no query item and all_slots_match stays true
-                if CI_key in self.no_query:
-                    continue
-                # If anything all_slots_match stays true AND the specific key slot gets a +1
-                if CI_value == 'anything':
-                    db_results_slots[CI_key] += 1
-                    continue
-                if CI_key in list(data.keys()):
-                    if CI_value.lower() == data[CI_key].lower() or data[CI_key] == 'anything':
-                        db_results_slots[CI_key] += 1
-                    else:
-                        all_slots_match = False
-                else:
-                    all_slots_match = False
-            if all_slots_match: db_results_slots['matching_all_constraints'] += 1
+        # Rows of the size database with the value 'anything' fit any informed value
+        db_results_slots = self._count_slot_matches(self.size_database, self.size_db_masks, new_current_informs,
+                                                    match_anything_rows=True)
 
-        # update cache (set the empty dict)
-        self.cached_size_db_slot[inform_items].update(db_results_slots)
-        assert self.cached_size_db_slot[inform_items] == db_results_slots
+        # update cache
+        self.cached_size_db_slot.put(inform_items, db_results_slots)
 
         return db_results_slots
 
@@ -309,7 +342,8 @@ class DBQuery:
             elif size_db_results:
                 # DEBUG_PRINT("db_results size = ", db_results)
                 size_values_dict = self._count_slot_values('size_customer', size_db_results)
-                DEBUG_PRINT("size_values_dict: ", size_values_dict)
+                if _DEBUG:
+                    DEBUG_PRINT("size_values_dict: ", size_values_dict)
                 if size_values_dict:
                     # Get key with max value (ie slot value with highest count of available results)
                     # size_customer = max(values_dict, key=values_dict.get)
@@ -319,7 +353,8 @@ class DBQuery:
                             size_customer = max(size_values_dict, key=size_values_dict.get)
                         else:
                             size_customer = list(size_values_dict.keys())
-                    DEBUG_PRINT("size_customer = ", size_customer)
+                    if _DEBUG:
+                        DEBUG_PRINT("size_customer = ", size_customer)
                 else:
                     size_customer = 'no match available'
                     # if len(list(values_dict.keys())) > 1:
@@ -341,7 +376,8 @@ class DBQuery:
             # DEBUG_PRINT(db_results)
 
             values_dict = self._count_slot_values(key, db_results)
-            DEBUG_PRINT("values_dict: ", values_dict)
+            if _DEBUG:
+                DEBUG_PRINT("values_dict: ", values_dict)
             if values_dict:
                 # Get key with max value (ie slot value with highest count of available results)
                 # filled_inform[key] = max(values_dict, key=values_dict.get)
@@ -388,7 +424,8 @@ class DBQuery:
         #                 value.append(item[key])
         #         filled_inform.update({key: value})
 
-        DEBUG_PRINT("result: ", filled_inform)
+        if _DEBUG:
+            DEBUG_PRINT("result: ", filled_inform)
         return filled_inform
 
     def get_db_results(self, constraints):
@@ -415,7 +452,8 @@ class DBQuery:
             elif size_db_results:
                 # DEBUG_PRINT("db_results size = ", db_results)
                 size_values_dict = self._count_slot_values('size_customer', size_db_results)
-                DEBUG_PRINT("size_values_dict: ", size_values_dict)
+                if _DEBUG:
+                    DEBUG_PRINT("size_values_dict: ", size_values_dict)
                 if size_values_dict:
                     # Get key with max value (ie slot value with highest count of available results)
                     # size_customer = max(values_dict, key=values_dict.get)
@@ -425,7 +463,8 @@ class DBQuery:
                             size_customer = max(size_values_dict, key=size_values_dict.get)
                         else:
                             size_customer = ''
-                    DEBUG_PRINT("size_customer = ", size_customer)
+                    if _DEBUG:
+                        DEBUG_PRINT("size_customer = ", size_customer)
                 else:
                     size_customer = 'no match available'
             else:
@@ -456,7 +495,8 @@ class DBQuery:
             if k not in self.no_query and v != 'anything' and k not in self.size_slots}
 
         if len(list(new_constraints.keys())) == 0:
-            DEBUG_PRINT("constraints = ", constraints)
+            if _DEBUG:
+                DEBUG_PRINT("constraints = ", constraints)
             # return []
         # if 'amount_product' not in list(new_constraints.keys()):
         #     new_constraints.update({'amount_product': 1})
@@ -468,51 +508,19 @@ class DBQuery:
         inform_items = frozenset(new_constraints.items())
         # DEBUG_PRINT(inform_items)
 
-        cache_return = self.cached_db[inform_items]
+        cache_return = self.cached_db.get(inform_items)
         # DEBUG_PRINT(cache_return)
 
-        if cache_return == None:
-            # If it is none then no matches fit with the constraints so return an empty dict
-            return []
-        # if it isnt empty then return what it is
-        if cache_return:
+        # An empty list means no matches fit with the constraints
+        if cache_return is not None:
             return cache_return
         # else continue on
 
-        # return db that contains the value of required entity
-        # db_new = self.database
-        # for constraint_key in list(new_constraints.keys()):
-        #     db_new = self._loop(constraint_key, new_constraints[constraint_key], db_new)
-        # DEBUG_PRINT(db_new)
-
-        available_options = []
-        for data in self.database:
-            current_option_dict = data
-            # First check if that database item actually contains the inform keys
-            # Note: this assumes that if a constraint is not found in the db item then that item is not a match
-            # DEBUG_PRINT(set(new_constraints.keys()))
-            # DEBUG_PRINT(set(data.keys()))
-            # DEBUG_PRINT(len(set(new_constraints.keys()) - set(data.keys())))
-            if len(set(new_constraints.keys()) - set(data.keys())) == 0:
-                match = True
-                # Now check all the constraint values against the db values and if there is a mismatch don't store
-                for k, v in new_constraints.items():
-                    # if k == "amount_product":
-                    #     if v > data[k]:
-                    #         match = False
-                    # elif not check_match_sublist_and_substring(v, data[k]):
-                    #     match = False
-                    if str(v).lower() != str(current_option_dict[k]).lower():
-                        match = False
-                if match:
-                    # Update cache
-                    self.cached_db[inform_items].append(current_option_dict)
-                    available_options.append(current_option_dict)
+        available_options = self.database.rows(self.database.match_rows(new_constraints))
         # DEBUG_PRINT("available_options = ", available_options)
 
-        # if nothing available then set the set of constraint items to none in cache
-        if not available_options:
-            self.cached_db[inform_items] = None
+        # Update cache, an empty list is stored as well so that a query with no matches is not run again
+        self.cached_db.put(inform_items, available_options)
 
         return available_options
 
@@ -535,7 +543,8 @@ class DBQuery:
             if k not in self.no_query and v != 'anything' and k in self.size_slots}
         
         if len(list(new_constraints.keys())) == 0:
-            DEBUG_PRINT("constraints = ", constraints)
+            if _DEBUG:
+                DEBUG_PRINT("constraints = ", constraints)
             return -1
         # if 'amount_product' not in list(new_constraints.keys()):
         #     new_constraints.update({'amount_product': 1})
@@ -547,51 +556,19 @@ class DBQuery:
         inform_items = frozenset(new_constraints.items())
         # DEBUG_PRINT(inform_items)
 
-        cache_return = self.cached_size_db[inform_items]
+        cache_return = self.cached_size_db.get(inform_items)
         # DEBUG_PRINT(cache_return)
 
-        if cache_return == None:
-            # If it is none then no matches fit with the constraints so return an empty dict
-            return []
-        # if it isnt empty then return what it is
-        if cache_return:
+        # An empty list means no matches fit with the constraints
+        if cache_return is not None:
             return cache_return
         # else continue on
 
-        # return db that contains the value of required entity
-        # db_new = self.database
-        # for constraint_key in list(new_constraints.keys()):
-        #     db_new = self._loop(constraint_key, new_constraints[constraint_key], db_new)
-        # DEBUG_PRINT(db_new)
-
-        available_options = []
-        for data in self.size_database:
-            current_option_dict = data
-            # First check if that database item actually contains the inform keys
-            # Note: this assumes that if a constraint is not found in the db item then that item is not a match
-            # DEBUG_PRINT(set(new_constraints.keys()))
-            # DEBUG_PRINT(set(data.keys()))
-            # DEBUG_PRINT(len(set(new_constraints.keys()) - set(data.keys())))
-            if len(set(new_constraints.keys()) - set(data.keys())) == 0:
-                match = True
-                # Now check all the constraint values against the db values and if there is a mismatch don't store
-                for k, v in new_constraints.items():
-                    # if k == "amount_product":
-                    #     if v > data[k]:
-                    #         match = False
-                    # elif not check_match_sublist_and_substring(v, data[k]):
-                    #     match = False
-                    if str(v).lower() != str(current_option_dict[k]).lower():
-                        match = False
-                if match:
-                    # Update cache
-                    self.cached_size_db[inform_items].append(current_option_dict)
-                    available_options.append(current_option_dict)
+        available_options = self.size_database.rows(self.size_database.match_rows(new_constraints))
         # DEBUG_PRINT("available_options = ", available_options)
 
-        # if nothing available then set the set of constraint items to none in cache
-        if not available_options:
-            self.cached_size_db[inform_items] = None
+        # Update cache, an empty list is stored as well so that a query with no matches is not run again
+        self.cached_size_db.put(inform_items, available_options)
 
         return available_options
 
@@ -607,3 +584,20 @@ class DBQuery:
             elif (check_match_sublist_and_substring(constraint_val,data[constraint_key])):
                 db_new.append(data)
         return db_new
+
+
+def merge_cache_stats(cache_stats_list):
+    """
+    Returns the query cache statistics of several DBQuery objects added together per cache.
+
+    Parameters:
+        cache_stats_list (list): Dicts returned by DBQuery.get_cache_stats
+
+    Returns:
+        dict: The merged stats dict of each cache, see cache.merge_stats
+    """
+
+    if not cache_stats_list:
+        return {}
+    return {name: merge_stats([cache_stats[name] for cache_stats in cache_stats_list])
+            for name in cache_stats_list[0]}
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+from array import array
+import numpy as np
+
+
+def build_index(file_path, index_path):
+    """
+    Writes the byte offsets of the lines of a JSONL file, plus the file size, in an .npy file.
+
+    The file is read line by line, so its size does not matter. Blank lines are skipped.
+
+    Parameters:
+        file_path (string): The JSONL file, one dialog per line
+        index_path (string)
+    """
+
+    offsets = array('q')
+    offset = 0
+    with open(file_path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                offsets.append(offset)
+            offset += len(line)
+    offsets.append(offset)
+    np.save(index_path, np.frombuffer(offsets, dtype=np.int64))
+
+
+def convert_dialogs(json_path, jsonl_path):
+    """
+    Writes the dialogs of a json file (a list of dialogs) to a JSONL file, one dialog per line, and indexes it.
+
+    Parameters:
+        json_path (string)
+        jsonl_path (string)
+    """
+
+    with open(json_path, encoding='utf-8') as f:
+        dialogs = json.load(f)
+    with open(jsonl_path, 'w', encoding='utf-8') as f:
+        for dialog in dialogs:
+            f.write(json.dumps(dialog, ensure_ascii=False))
+            f.write('\n')
+    build_index(jsonl_path, jsonl_path + '.idx.npy')
+
+
+class DialogReader:
+    """A read only list of the dialogs of a JSONL file, each dialog is read from the file when accessed."""
+
+    def __init__(self, file_path):
+        """
+        The constructor for DialogReader.
+
+        The index of the line offsets is kept next to the file (file_path + '.idx.npy') and rebuilt if it is older than
+        the file or does not end at its size. It is memory mapped, so only the file handle and the pages of the index
+        in use take memory, however many dialogs there are.
+
+        Parameters:
+            file_path (string): The JSONL file, one dialog per line
+        """
+
+        self.file_path = file_path
+        index_path = file_path + '.idx.npy'
+        if not self._is_index_fresh(index_path):
+            build_index(file_path, index_path)
+        self.offsets = np.asarray(np.load(index_path, mmap_mode='r'))
+        # Opened on first access, in the process that reads
+        self.file = None
+
+    def _is_index_fresh(self, index_path):
+        if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(self.file_path):
+            return False
+        offsets = np.load(index_path, mmap_mode='r')
+        return len(offsets) > 0 and offsets[-1] == os.path.getsize(self.file_path)
+
+    def __getstate__(self):
+        return {'file_path': self.file_path}
+
+    def __setstate__(self, state):
+        self.__init__(state['file_path'])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        """
+        Returns a dialog, read and parsed from its line of the file.
+
+        Parameters:
+            index (int): The index of the dialog, negative from the end
+
+        Returns:
+            list: The actions of the dialog
+        """
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('Dialog index out of range!')
+        if self.file is None:
+            self.file = open(self.file_path, 'rb')
+        start, end = self.offsets[index:index + 2].tolist()
+        self.file.seek(start)
+        return json.loads(self.file.read(end - start))
+
+    def __iter__(self):
+        # Stream the lines in order, without seeking
+        with open(self.file_path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+if __name__ == "__main__":
+    # Convert a json dialogs file to an indexed JSONL file, set it as the dialogs file path to read dialogs on demand
+    # In terminal: python dialog_reader.py --input "data/dialogs.json" --output "data/dialogs.jsonl"
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', dest='input', type=str, default='data/dialogs.json')
+    parser.add_argument('--output', dest='output', type=str, default='data/dialogs.jsonl')
+    args = parser.parse_args()
+
+    convert_dialogs(args.input, args.output)
+    print('Dialogs written to {}'.format(args.output))
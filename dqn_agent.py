@@ -1,16 +1,38 @@
-from keras.models import Sequential
-from keras.layers import Dense
-from keras.optimizers import Adam
 import random, copy
 import numpy as np
 import re
-
-from utils import DEBUG_PRINT, SAVE_LOG
+from types import MappingProxyType
+
+from numpy_model import NumpyModel
+from batch_prefetcher import BatchPrefetcher
+from replay_memory import ReplayMemory, PrioritizedReplayMemory
+from state_tracker import get_state_slices, get_real_valued_columns
+from utils import DEBUG_PRINT, SAVE_LOG, MODELLOG
+from utils import convert_list_to_dict
 from dialogue_config import rule_requests, agent_actions
 
 # Some of the code based off of https://jaromiru.com/2016/09/27/lets-make-a-dqn-theory/
 # Note: In original paper's code the epsilon is not annealed and annealing is not implemented in this code either
 
+
+def masked_mse(y_true, y_pred):
+    """
+    The mse loss of Keras, except that NaN targets take the model outputs, so only the other outputs are trained.
+
+    Parameters:
+        y_true (tensor): The targets, NaN for the outputs not to train
+        y_pred (tensor): The model outputs
+
+    Returns:
+        tensor: The loss of each sample
+    """
+
+    import tensorflow as tf
+
+    y_true = tf.where(tf.math.is_nan(y_true), tf.stop_gradient(y_pred), y_true)
+    return tf.reduce_mean(tf.square(y_pred - y_true), axis=-1)
+
+
 class DQNAgent:
     """The DQN agent that interacts with the user."""
 
@@ -30,34 +52,82 @@ class DQNAgent:
 
         self.max_round = constants['run']['max_round_num'] # number of round (one time sentence user-agent) in episode
 
-        # the agents memory
-        self.memory = []
-        self.memory_index = 0
-
         self.eps = constants['agent']['epsilon_init']
         self.lr = constants['agent']['learning_rate']
         self.gamma = constants['agent']['gamma']
         self.batch_size = constants['agent']['batch_size']
         self.hidden_size = constants['agent']['dqn_hidden_size']
         self.vanilla = constants['agent']['vanilla']
+        # 'keras' or 'numpy', the numpy backend trains and runs the models without importing TensorFlow
+        self.backend = constants['agent']['backend']
+        # Run each training step as one compiled TensorFlow graph function (TensorFlow 2 only)
+        self.graph_train_step = constants['agent']['graph_train_step']
+        # Sample the experiences in proportion to their TD error instead of uniformly
+        self.prioritized_replay = constants['agent']['prioritized_replay']
+        # The max number of gradient steps per train call, 0 for no max
+        self.train_steps = constants['agent']['train_steps']
+        # Gradient steps per added experience, 0 to run len(memory) // batch_size steps per train call
+        self.update_to_data = constants['agent']['update_to_data']
+        # Train on all the batches of a train call with one fit, made ahead by a background thread
+        self.single_fit = constants['agent']['single_fit']
+        self.prefetch_batches = constants['agent']['prefetch_batches']
+        # Store the binary columns of the states in the memory as bits
+        self.pack_states = constants['agent']['pack_states']
 
         if self.max_memory_size < self.batch_size:
             raise ValueError('Max memory size must be at least as great as batch size!')
+        if self.backend not in ('keras', 'numpy'):
+            raise ValueError('Backend: {} must be keras or numpy'.format(self.backend))
+        if self.graph_train_step and self.backend != 'keras':
+            raise ValueError('graph_train_step requires the keras backend!')
+        if self.single_fit and self.graph_train_step:
+            raise ValueError('single_fit and graph_train_step cannot both be set!')
+        if self.train_steps < 0 or self.update_to_data < 0:
+            raise ValueError('train_steps and update_to_data must not be negative!')
+        # Spread training calls train after every episode, a full sweep over the memory each time would multiply the
+        # training cost by the train frequency
+        if constants['run']['spread_training'] and self.train_steps == 0 and self.update_to_data == 0:
+            raise ValueError('spread_training requires a train_steps or update_to_data budget!')
 
         self.state_size = state_size
+        real_columns = None
+        if self.pack_states:
+            max_round_num = constants['run']['max_round_num']
+            if max(block.stop for block in get_state_slices(max_round_num).values()) != state_size:
+                raise ValueError('pack_states requires the state representation of StateTracker!')
+            real_columns = get_real_valued_columns(max_round_num)
+        # the agents memory
+        if self.prioritized_replay:
+            self.memory = PrioritizedReplayMemory(self.max_memory_size, self.state_size,
+                                                  constants['agent']['per_alpha'], constants['agent']['per_beta'],
+                                                  constants['agent']['per_beta_increment'], real_columns=real_columns)
+        else:
+            self.memory = ReplayMemory(self.max_memory_size, self.state_size, real_columns)
         self.possible_actions = agent_actions
         self.num_actions = len(self.possible_actions)
+        # Prebuilt read-only templates of the possible actions, copied with _copy_action when picked
+        self.action_templates = tuple(MappingProxyType({'intent': action['intent'],
+                                                        'inform_slots': MappingProxyType(dict(action['inform_slots'])),
+                                                        'request_slots': MappingProxyType(dict(action['request_slots']))})
+                                      for action in self.possible_actions)
+        # {tuple: int} The index of each action by its canonical key, see _action_key
+        self.action_keys = [self._action_key(action) for action in self.possible_actions]
+        self.action_index = convert_list_to_dict(self.action_keys)
 
         self.rule_request_set = rule_requests
 
         self.beh_model = self._build_model()
         self.tar_model = self._build_model()
+        self._train_step = self._build_train_step() if self.graph_train_step else None
 
         self.save_weights_file_path = constants['agent']['save_weights_file_path']
         self.load_weights_file_path = constants['agent']['load_weights_file_path']
 
         self._load_weights()
 
+        # The gradient steps earned by the experiences added since the last train call, with update_to_data
+        self.pending_train_steps = 0.
+
         self.reset()
 
     def reset(self):
@@ -69,13 +139,13 @@ class DQNAgent:
     def is_memory_full(self):
         """Returns true if the memory is full."""
 
-        return len(self.memory) >= self.max_memory_size
+        return self.memory.is_full()
 
     def empty_memory(self):
         """Empties the memory and resets the memory index."""
 
-        self.memory = []
-        self.memory_index = 0
+        self.memory.clear()
+        self.pending_train_steps = 0.
 
     def add_experience(self, state, action, reward, next_state, done):
         """
@@ -89,10 +159,39 @@ class DQNAgent:
             done (bool)
         """
 
-        if len(self.memory) < self.max_memory_size:
-            self.memory.append(None)
-        self.memory[self.memory_index] = (state, action, reward, next_state, done)
-        self.memory_index = (self.memory_index + 1) % self.max_memory_size
+        self.memory.add(state, action, reward, next_state, done)
+        self.pending_train_steps += self.update_to_data
+
+    def add_experiences(self, states, actions, rewards, next_states, dones):
+        """
+        Adds the experience tuples made of the rows of the parameters to the memory.
+
+        Parameters:
+            states (numpy.array)
+            actions (numpy.array)
+            rewards (numpy.array)
+            next_states (numpy.array)
+            dones (numpy.array)
+        """
+
+        self.memory.add_batch(states, actions, rewards, next_states, dones)
+        self.pending_train_steps += self.update_to_data * len(actions)
+
+    def _copy_action(self, template):
+        """
+        Returns a copy of an action template that the state tracker can change.
+
+        The slot dicts hold only strings, so copying them is as good as a deep copy.
+
+        Parameters:
+            template (mapping): An action of format dict('intent': string, 'inform_slots': dict, 'request_slots': dict)
+
+        Returns:
+            dict
+        """
+
+        return {'intent': template['intent'], 'inform_slots': dict(template['inform_slots']),
+                'request_slots': dict(template['request_slots'])}
 
     def _map_index_to_action(self, index):
         """
@@ -105,10 +204,23 @@ class DQNAgent:
             dict
         """
 
-        for (i, action) in enumerate(self.possible_actions):
-            if index == i:
-                return copy.deepcopy(action)
-        raise ValueError('Index: {} not in range of possible actions'.format(index))
+        if not 0 <= index < self.num_actions:
+            raise ValueError('Index: {} not in range of possible actions'.format(index))
+        return self._copy_action(self.action_templates[index])
+
+    def _action_key(self, action):
+        """
+        Returns the canonical hashable key of an action.
+
+        Parameters:
+            action (dict): format dict('intent': string, 'inform_slots': dict, 'request_slots': dict)
+
+        Returns:
+            tuple: The intent, the frozenset of the inform slot items and the frozenset of the request slot items
+        """
+
+        return (action['intent'], frozenset(action['inform_slots'].items()),
+                frozenset(action['request_slots'].items()))
 
     def _map_action_to_index(self, response):
         """
@@ -121,20 +233,31 @@ class DQNAgent:
             int
         """
 
-        for (i, action) in enumerate(self.possible_actions):
-            if response == action:
-                return i
-        raise ValueError('Response: {} not found in possible actions'.format(response))
+        try:
+            return self.action_index[self._action_key(response)]
+        except (KeyError, TypeError):
+            # TypeError for unhashable slot values, which are not in possible actions either
+            raise ValueError('Response: {} not found in possible actions'.format(response))
 
 
     """RL Model."""
     def _build_model(self):
         """Builds and returns model/graph of neural network."""
 
+        if self.backend == 'numpy':
+            model = NumpyModel(self.state_size, self.hidden_size, self.num_actions)
+            model.compile(self.lr)
+            return model
+
+        from keras.models import Sequential
+        from keras.layers import Dense
+        from keras.optimizers import Adam
+
         model = Sequential()
         model.add(Dense(self.hidden_size, input_dim=self.state_size, activation='relu'))
         model.add(Dense(self.num_actions, activation='linear'))
-        model.compile(loss='mse', optimizer=Adam(lr=self.lr))
+        # single_fit trains on targets that are NaN except for the taken actions
+        model.compile(loss=masked_mse if self.single_fit else 'mse', optimizer=Adam(lr=self.lr))
         weights = model.layers[1].get_weights()[0]
         biases = model.layers[1].get_weights()[1]
 
@@ -142,10 +265,56 @@ class DQNAgent:
         # print("initial biases =", biases)
         return model
 
+    def _build_train_step(self):
+        """
+        Builds and returns a training step compiled into one TensorFlow graph function.
+
+        The function runs one forward pass of each model (the behavior model on the states and next states together),
+        computes the Bellman targets and applies one gradient step of the mse loss with the optimizer of the behavior
+        model. It takes the states, actions, rewards, next states and dones arrays of a batch.
+        """
+
+        import tensorflow as tf
+
+        if not tf.executing_eagerly():
+            raise ValueError('graph_train_step requires TensorFlow 2 (eager execution)!')
+
+        beh_model = self.beh_model
+        tar_model = self.tar_model
+        gamma = self.gamma
+        vanilla = self.vanilla
+
+        @tf.function
+        def train_step(states, actions, rewards, next_states, dones, weights):
+            batch_size = tf.shape(states)[0]
+            tar_next_state_preds = tar_model(next_states)
+            with tf.GradientTape() as tape:
+                if vanilla:
+                    beh_state_preds = beh_model(states)
+                    next_state_values = tf.reduce_max(tar_next_state_preds, axis=1)
+                else:
+                    beh_preds = beh_model(tf.concat([states, next_states], axis=0))
+                    beh_state_preds = beh_preds[:batch_size]
+                    next_actions = tf.argmax(beh_preds[batch_size:], axis=1, output_type=tf.int32)
+                    next_state_values = tf.gather(tar_next_state_preds, next_actions, batch_dims=1)
+                q_targets = rewards + gamma * next_state_values * (1. - tf.cast(dones, tf.float32))
+                indices = tf.stack([tf.range(batch_size), actions], axis=1)
+                targets = tf.stop_gradient(tf.tensor_scatter_nd_update(beh_state_preds, indices, q_targets))
+                # The mean squared error of each experience, weighted like Keras fit does with sample_weight
+                loss = tf.reduce_mean(weights * tf.reduce_mean(tf.square(targets - beh_state_preds), axis=1))
+            gradients = tape.gradient(loss, beh_model.trainable_variables)
+            beh_model.optimizer.apply_gradients(zip(gradients, beh_model.trainable_variables))
+            # The TD errors of the taken actions
+            return q_targets - tf.gather_nd(beh_state_preds, indices)
+
+        return train_step
+
     def _dqn_predict(self, states, target=False):
         """
         Returns a model prediction given an array of states.
 
+        Runs the model on the whole array as one batch with predict_on_batch, which skips the per-call setup of predict.
+
         Parameters:
             states (numpy.array)
             target (bool)
@@ -155,9 +324,9 @@ class DQNAgent:
         """
 
         if target:
-            return self.tar_model.predict(states)
+            return self.tar_model.predict_on_batch(states)
         else:
-            return self.beh_model.predict(states)
+            return self.beh_model.predict_on_batch(states)
 
     def train(self):
         """
@@ -166,61 +335,192 @@ class DQNAgent:
         Takes batches of memories from the memory pool and processing them. The processing takes the tuples and stacks
         them in the correct format for the neural network and calculates the Bellman equation for Q-Learning.
 
+        Each batch needs one forward pass per model, for DDQN the states and next states go through the behavior model
+        together. With graph_train_step the whole step runs as one graph function (without the MODELLOG diagnostics).
+        With prioritized replay, the loss of each experience is weighted by its importance sampling weight and its
+        priority is updated from its TD error. The number of batches is bounded, see _get_num_batches. With single_fit
+        all the batches go through one fit, see _train_single_fit.
+
         """
 
-        # Calc. num of batches to run
-        num_batches = len(self.memory) // self.batch_size
+        num_batches = self._get_num_batches()
+        if self.single_fit:
+            if num_batches > 0:
+                self._train_single_fit(num_batches)
+            return
         for b in range(num_batches):
-            batch = random.sample(self.memory, self.batch_size)
-
-            states = np.array([sample[0] for sample in batch])
+            indices = self.memory.sample_indices(self.batch_size)
+            states, actions, rewards, next_states, dones = self.memory.get_batch(indices)
+            # Importance sampling weights with prioritized replay, else None
+            weights = self.memory.get_weights(indices)
             # DEBUG_PRINT("states = ", states)
-            next_states = np.array([sample[3] for sample in batch])
 
             assert states.shape == (self.batch_size, self.state_size), 'States Shape: {}'.format(states.shape)
             assert next_states.shape == states.shape
 
-            beh_state_preds = self._dqn_predict(states)  # For leveling error
-            # DEBUG_PRINT("beh_state_preds = ", beh_state_preds)
-            if not self.vanilla:
-                beh_next_states_preds = self._dqn_predict(next_states)  # For indexing for DDQN
-            tar_next_state_preds = self._dqn_predict(next_states, target=True)  # For target value for DQN (& DDQN)
-
-            inputs = np.zeros((self.batch_size, self.state_size))
-            targets = np.zeros((self.batch_size, self.num_actions))
-
-            for i, (s, a, r, s_, d) in enumerate(batch):
-                # DEBUG_PRINT("i = ", i)
-                t = beh_state_preds[i]
-                predict = beh_state_preds[i]
-                q = beh_state_preds[i][a]
-                SAVE_LOG("next state = ", \
-                "\nuser intent: ", s_[:6], "\ninform: ", s_[6:13], "\nrequest: ", s_[13:20], \
-                "\nagent intent: ", s_[20:26], "\ninform: ", s_[26:33], "\nrequest: ", s_[33:40], \
-                "\ncurrent inform: ", s_[40:47], \
-                "\nresult db: ", s_[68:76])
-                SAVE_LOG("Output predict = ", predict)
-                if not self.vanilla:
-                    SAVE_LOG("Get action have Q max next state = ", beh_next_states_preds[i])
-                    SAVE_LOG("Output predict next state = ", tar_next_state_preds[i])
-                    t[a] = r + self.gamma * tar_next_state_preds[i][np.argmax(beh_next_states_preds[i])] * (not d)
-                else:
-                    t[a] = r + self.gamma * np.amax(tar_next_state_preds[i]) * (not d)
-                # SAVE_LOG("input state: ", s)
-                SAVE_LOG("input state: ", \
-                "\nuser intent: ", s[:6], "\ninform: ", s[6:13], "\nrequest: ", s[13:20], \
-                "\nagent intent: ", s[20:26], "\ninform: ", s[26:33], "\nrequest: ", s[33:40], \
-                "\ncurrent inform: ", s[40:47], \
-                "\nresult db: ", s[68:76])
-                SAVE_LOG("Output predict = ", predict)
-                # SAVE_LOG("Q* = ", t[a])
-                loss = t[a] - q
-                SAVE_LOG("loss of action [", a, "] = ", loss)
-
-                inputs[i] = s
-                targets[i] = t
-
-            self.beh_model.fit(inputs, targets, epochs=1, verbose=0, batch_size=self.batch_size)
+            if self._train_step is not None:
+                if weights is None:
+                    weights = np.ones(self.batch_size, dtype=np.float32)
+                td_errors = self._train_step(states, actions, rewards, next_states, dones, weights)
+                self.memory.update_priorities(indices, td_errors.numpy())
+                continue
+
+            targets, td_errors = self._get_targets(states, actions, rewards, next_states, dones, self.beh_model,
+                                                   self.tar_model)
+            self.memory.update_priorities(indices, td_errors)
+            self.beh_model.fit(states, targets, sample_weight=weights, epochs=1, verbose=0, batch_size=self.batch_size)
+
+    def _train_single_fit(self, num_batches):
+        """
+        Trains the behavior model on num_batches batches with a single fit call.
+
+        A background thread samples the memory and computes the Bellman targets of the taken actions ahead of the
+        optimizer, with numpy copies of both models taken before the fit (the target model does not change during a
+        train call). The targets of the other actions are NaN, so the loss only counts the taken actions and the other
+        outputs get no gradient, like in the per batch path where their targets are the live outputs. For DDQN the
+        next actions are picked with the copy of the behavior model. The priorities are updated after the fit, from
+        the TD errors of that copy, so the memory is only read while the thread runs.
+
+        Parameters:
+            num_batches (int)
+        """
+
+        beh_model = self._freeze_model(self.beh_model)
+        tar_model = self._freeze_model(self.tar_model)
+        td_updates = []
+
+        def make_batch():
+            indices = self.memory.sample_indices(self.batch_size)
+            states, actions, rewards, next_states, dones = self.memory.get_batch(indices)
+            weights = self.memory.get_weights(indices)
+            targets, td_errors = self._get_targets(states, actions, rewards, next_states, dones, beh_model, tar_model,
+                                                   masked=True)
+            td_updates.append((indices, td_errors))
+            return (states, targets) if weights is None else (states, targets, weights)
+
+        prefetcher = BatchPrefetcher(make_batch, num_batches, self.prefetch_batches)
+        self.beh_model.fit(iter(prefetcher), steps_per_epoch=num_batches, epochs=1, verbose=0)
+        for indices, td_errors in td_updates:
+            self.memory.update_priorities(indices, td_errors)
+
+    def _freeze_model(self, model):
+        """Returns a numpy copy of a model, it keeps the current weights of the model."""
+
+        frozen = NumpyModel(self.state_size, self.hidden_size, self.num_actions)
+        frozen.set_weights(model.get_weights())
+        return frozen
+
+    def _get_targets(self, states, actions, rewards, next_states, dones, beh_model, tar_model, masked=False):
+        """
+        Returns the training targets of a batch, the behavior model outputs with the Bellman targets of the taken
+        actions, and the TD errors of the taken actions.
+
+        If masked, the targets of the actions not taken are NaN instead of the behavior model outputs, see masked_mse.
+
+        Parameters:
+            states (numpy.array)
+            actions (numpy.array)
+            rewards (numpy.array)
+            next_states (numpy.array)
+            dones (numpy.array)
+            beh_model: The behavior model, or a frozen copy of it
+            tar_model: The target model, or a frozen copy of it
+            masked (bool)
+
+        Returns:
+            numpy.array: The targets of shape (batch size, number of actions)
+            numpy.array: The TD errors of shape (batch size,)
+        """
+
+        batch_size = len(states)
+        beh_next_states_preds = None
+        if self.vanilla:
+            beh_state_preds = beh_model.predict_on_batch(states)  # For leveling error
+        else:
+            # For leveling error and for indexing for DDQN
+            beh_preds = beh_model.predict_on_batch(np.concatenate((states, next_states)))
+            beh_state_preds, beh_next_states_preds = beh_preds[:batch_size], beh_preds[batch_size:]
+        # DEBUG_PRINT("beh_state_preds = ", beh_state_preds)
+        tar_next_state_preds = tar_model.predict_on_batch(next_states)  # For target value for DQN (& DDQN)
+
+        rows = np.arange(batch_size)
+        q_targets = self._bellman_targets(rewards, dones, tar_next_state_preds, beh_next_states_preds)
+        targets = np.full_like(beh_state_preds, np.nan) if masked else beh_state_preds.copy()
+        targets[rows, actions] = q_targets
+        if MODELLOG:
+            self._log_batch(states, actions, next_states, beh_state_preds, targets, tar_next_state_preds,
+                            beh_next_states_preds)
+        return targets, q_targets - beh_state_preds[rows, actions]
+
+    def _get_num_batches(self):
+        """
+        Returns the number of batches to train on in this train call.
+
+        With update_to_data, that is the steps earned by the experiences added since the last call, else one sweep over
+        the memory (len(memory) // batch_size). Either way it is at most train_steps if set, the steps past it are
+        dropped so that the cost of a call stays bounded.
+
+        Returns:
+            int
+        """
+
+        if len(self.memory) < self.batch_size:
+            return 0
+        if self.update_to_data > 0:
+            num_batches = int(self.pending_train_steps)
+            self.pending_train_steps -= num_batches
+        else:
+            num_batches = len(self.memory) // self.batch_size
+        if self.train_steps > 0:
+            num_batches = min(num_batches, self.train_steps)
+        return num_batches
+
+    def _bellman_targets(self, rewards, dones, tar_next_state_preds, beh_next_states_preds=None):
+        """
+        Returns the Q-learning targets of the taken actions for a batch.
+
+        The value of the next state is the max target model output for DQN, or the target model output of the action
+        the behavior model picks for DDQN.
+
+        Parameters:
+            rewards (numpy.array): The rewards of shape (batch size,)
+            dones (numpy.array): The done flags of shape (batch size,)
+            tar_next_state_preds (numpy.array): The target model outputs for the next states
+            beh_next_states_preds (numpy.array): The behavior model outputs for the next states, for DDQN only
+
+        Returns:
+            numpy.array: The targets of shape (batch size,)
+        """
+
+        if beh_next_states_preds is None:
+            next_state_values = np.amax(tar_next_state_preds, axis=1)
+        else:
+            next_actions = np.argmax(beh_next_states_preds, axis=1)
+            next_state_values = np.take_along_axis(tar_next_state_preds, next_actions[:, None], axis=1)[:, 0]
+        return rewards + self.gamma * next_state_values * np.logical_not(dones)
+
+    def _log_batch(self, states, actions, next_states, beh_state_preds, targets, tar_next_state_preds,
+                   beh_next_states_preds=None):
+        """Logs the states, predictions and losses of a training batch to model.log, see MODELLOG."""
+
+        for i, (s, a, s_) in enumerate(zip(states, actions, next_states)):
+            SAVE_LOG("next state = ", \
+            "\nuser intent: ", s_[:6], "\ninform: ", s_[6:13], "\nrequest: ", s_[13:20], \
+            "\nagent intent: ", s_[20:26], "\ninform: ", s_[26:33], "\nrequest: ", s_[33:40], \
+            "\ncurrent inform: ", s_[40:47], \
+            "\nresult db: ", s_[68:76])
+            SAVE_LOG("Output predict = ", beh_state_preds[i])
+            if beh_next_states_preds is not None:
+                SAVE_LOG("Get action have Q max next state = ", beh_next_states_preds[i])
+                SAVE_LOG("Output predict next state = ", tar_next_state_preds[i])
+            SAVE_LOG("input state: ", \
+            "\nuser intent: ", s[:6], "\ninform: ", s[6:13], "\nrequest: ", s[13:20], \
+            "\nagent intent: ", s[20:26], "\ninform: ", s[26:33], "\nrequest: ", s[33:40], \
+            "\ncurrent inform: ", s[40:47], \
+            "\nresult db: ", s[68:76])
+            SAVE_LOG("Output predict = ", targets[i])
+            loss = targets[i][a] - beh_state_preds[i][a]
+            SAVE_LOG("loss of action [", a, "] = ", loss)
 
     def save_weights(self):
         """Saves the weights of both models in two h5 files."""
@@ -360,6 +660,29 @@ class DQNAgent:
         else:
             return self._dqn_action(state)
 
+    def get_actions_train(self, states):
+        """
+        Returns the actions of the agent given a batch of states, one per environment.
+
+        The behavior model runs once on the whole batch, then each action is picked epsilon-greedily like in
+        get_action_train.
+
+        Parameters:
+            states (numpy.array): The states of shape (number of environments, state size)
+
+        Returns:
+            list: The (index, action) tuple of each state
+        """
+
+        greedy_indices = np.argmax(self._dqn_predict(states), axis=1)
+        index_actions = []
+        for index in greedy_indices:
+            if self.eps > random.random():
+                index = random.randint(0, self.num_actions - 1)
+            index = int(index)
+            index_actions.append((index, self._map_index_to_action(index)))
+        return index_actions
+
     def _dqn_action(self, state):
         """
         Returns a behavior model output given a state.
@@ -372,9 +695,7 @@ class DQNAgent:
             dict: The action/response itself
         """
 
-        prop = self._dqn_predict_one(state)
-        # DEBUG_PRINT("prop action = ", prop)
-        index = np.argmax(self._dqn_predict_one(state))
+        index = int(np.argmax(self._dqn_predict_one(state)))
         action = self._map_index_to_action(index)
         return index, action
 
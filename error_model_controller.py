@@ -1,5 +1,6 @@
 import random
 
+from catalog import Catalog
 from utils import DEBUG_PRINT, SAVE_LOG
 from dialogue_config import usersim_intents, size_slots
 
@@ -14,14 +15,15 @@ class ErrorModelController:
         Saves items in constants, etc.
 
         Parameters:
-            db_dict (dict): The database dict with format dict(string: list) where each key is the slot name and
-                            the list is of possible values
+            db_dict (dict or Catalog): The database dict with format dict(string: list) where each key is the slot name
+                                       and the list is of possible values, or the catalog holding it
+            size_db_dict (dict or Catalog): The size database dict, same format as db_dict
             constants (dict): Loaded constants in dict
         """
 
         # print("caller ErrorModelController __init__")
-        self.shopping_dict = db_dict
-        self.size_shopping_dict = size_db_dict
+        self.shopping_dict = db_dict.slot_values if isinstance(db_dict, Catalog) else db_dict
+        self.size_shopping_dict = size_db_dict.slot_values if isinstance(size_db_dict, Catalog) else size_db_dict
         self.slot_error_prob = constants['emc']['slot_error_prob']
         self.slot_error_mode = constants['emc']['slot_error_mode']  # [0, 3]
         self.intent_error_prob = constants['emc']['intent_error_prob']
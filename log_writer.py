@@ -0,0 +1,99 @@
+import threading
+import time
+
+
+class LogWriter:
+    """Buffers log lines in memory per file and writes them out in batches to files that are kept open."""
+
+    def __init__(self, buffer_size, flush_interval, threaded=False):
+        """
+        The constructor for LogWriter.
+
+        The buffers are written out once they hold buffer_size characters or flush_interval seconds passed since the
+        last write out. Without the writer thread, this is checked on each write, so the lines of a quiet log can stay
+        in memory until flush or close.
+
+        Parameters:
+            buffer_size (int): The number of buffered characters, of all files, that triggers a write out
+            flush_interval (float): The max number of seconds between write outs of buffered lines
+            threaded (bool): True to write out in a background thread instead of in the logging thread
+        """
+
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.buffers = {}
+        self.buffered = 0
+        self.handles = {}
+        self.last_flush = time.monotonic()
+        self.closed = False
+        # lock guards the buffers, io_lock keeps the write outs in the order the buffers were taken
+        self.lock = threading.Lock()
+        self.io_lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.thread = None
+        if threaded:
+            self.thread = threading.Thread(target=self._run, name='LogWriter', daemon=True)
+            self.thread.start()
+
+    def write(self, filename, string):
+        """
+        Adds a string to the buffer of a file.
+
+        Parameters:
+            filename (string)
+            string (string)
+        """
+
+        with self.lock:
+            parts = self.buffers.get(filename)
+            if parts is None:
+                parts = self.buffers[filename] = []
+            parts.append(string)
+            self.buffered += len(string)
+            if self.buffered < self.buffer_size and time.monotonic() - self.last_flush < self.flush_interval:
+                return
+            if self.thread is not None:
+                self.wakeup.notify()
+                return
+        self.flush()
+
+    def flush(self):
+        """Writes out the buffered strings of all files."""
+
+        with self.io_lock:
+            with self.lock:
+                buffers = self.buffers
+                self.buffers = {}
+                self.buffered = 0
+                self.last_flush = time.monotonic()
+            for filename, parts in buffers.items():
+                handle = self.handles.get(filename)
+                if handle is None:
+                    handle = self.handles[filename] = open(filename, 'a')
+                handle.write(''.join(parts))
+                handle.flush()
+
+    def _run(self):
+        while True:
+            with self.wakeup:
+                if not self.closed and self.buffered < self.buffer_size:
+                    self.wakeup.wait(self.flush_interval)
+                closed = self.closed
+            self.flush()
+            if closed:
+                return
+
+    def close(self):
+        """Writes out the buffered strings, stops the writer thread and closes the files."""
+
+        with self.wakeup:
+            self.closed = True
+            self.wakeup.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+        with self.io_lock:
+            for handle in self.handles.values():
+                handle.close()
+            self.handles = {}
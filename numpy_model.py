@@ -0,0 +1,208 @@
+import numpy as np
+import h5py
+
+
+class NumpyModel:
+    """The Dense(relu) -> Dense(linear) network of the DQN agent with its mse loss and Adam, in NumPy float32."""
+
+    def __init__(self, input_size, hidden_size, output_size):
+        """
+        The constructor for NumpyModel.
+
+        Initializes the weights like Keras Dense layers do: glorot uniform kernels and zero biases.
+
+        Parameters:
+            input_size (int): The state representation size
+            hidden_size (int): The number of units of the hidden layer
+            output_size (int): The number of actions
+        """
+
+        self.layer_sizes = [(input_size, hidden_size), (hidden_size, output_size)]
+        self.weights = []
+        for fan_in, fan_out in self.layer_sizes:
+            limit = np.sqrt(6. / (fan_in + fan_out))
+            self.weights.append(np.random.uniform(-limit, limit, (fan_in, fan_out)).astype(np.float32))
+            self.weights.append(np.zeros(fan_out, dtype=np.float32))
+        self.learning_rate = None
+
+    def compile(self, learning_rate, beta_1=0.9, beta_2=0.999, epsilon=1e-7):
+        """
+        Sets up Adam with the defaults of Keras Adam, which fit needs.
+
+        Parameters:
+            learning_rate (float)
+            beta_1 (float): The decay rate of the first moment estimates
+            beta_2 (float): The decay rate of the second moment estimates
+            epsilon (float): Keeps the update steps finite
+        """
+
+        self.learning_rate = learning_rate
+        self.beta_1 = beta_1
+        self.beta_2 = beta_2
+        self.epsilon = epsilon
+        self.iterations = 0
+        self.moments = [np.zeros_like(w) for w in self.weights]
+        self.velocities = [np.zeros_like(w) for w in self.weights]
+
+    def get_weights(self):
+        """Returns copies of the kernels and biases, in the order of Keras get_weights."""
+
+        return [w.copy() for w in self.weights]
+
+    def set_weights(self, weights):
+        """
+        Sets the kernels and biases.
+
+        Parameters:
+            weights (list): The kernels and biases, in the order of Keras get_weights
+        """
+
+        assert len(weights) == len(self.weights)
+        for i, w in enumerate(weights):
+            assert np.shape(w) == self.weights[i].shape, 'Weights Shape: {}'.format(np.shape(w))
+            self.weights[i] = np.array(w, dtype=np.float32)
+
+    def predict_on_batch(self, states):
+        """
+        Returns the outputs of the network given an array of states.
+
+        Parameters:
+            states (numpy.array): The states of shape (batch size, input size)
+
+        Returns:
+            numpy.array: The outputs of shape (batch size, output size)
+        """
+
+        kernel_1, bias_1, kernel_2, bias_2 = self.weights
+        hidden = np.dot(states, kernel_1)
+        hidden += bias_1
+        np.maximum(hidden, 0., out=hidden)
+        outputs = np.dot(hidden, kernel_2)
+        outputs += bias_2
+        return outputs
+
+    predict = predict_on_batch
+
+    def train_on_batch(self, states, targets, sample_weight=None):
+        """
+        Runs one Adam step of the mse loss on a batch and returns the loss before the step.
+
+        Like Keras, the loss is the mean over the batch of the mean squared error of each sample, times its weight.
+        NaN targets take the outputs, so those outputs are not trained, like with masked_mse of dqn_agent.py.
+
+        Parameters:
+            states (numpy.array): The states of shape (batch size, input size)
+            targets (numpy.array): The targets of shape (batch size, output size), NaN for the outputs not to train
+            sample_weight (numpy.array): The weights of the samples, or None to weigh them all 1
+
+        Returns:
+            float
+        """
+
+        assert self.learning_rate is not None, 'The model must be compiled before training'
+        kernel_1, bias_1, kernel_2, bias_2 = self.weights
+        hidden = np.dot(states, kernel_1)
+        hidden += bias_1
+        np.maximum(hidden, 0., out=hidden)
+        outputs = np.dot(hidden, kernel_2)
+        outputs += bias_2
+
+        errors = outputs - targets
+        errors[np.isnan(targets)] = 0.
+        sample_losses = np.mean(np.square(errors), axis=1)
+        if sample_weight is not None:
+            sample_losses *= sample_weight
+            errors *= sample_weight[:, np.newaxis]
+        # Gradient of the loss with respect to the outputs
+        errors *= np.float32(2. / errors.size)
+
+        grad_hidden = np.dot(errors, kernel_2.T)
+        grad_hidden[hidden <= 0.] = 0.
+        gradients = [np.dot(states.T, grad_hidden), grad_hidden.sum(axis=0), np.dot(hidden.T, errors),
+                     errors.sum(axis=0)]
+        self._apply_gradients(gradients)
+        return float(np.mean(sample_losses))
+
+    def _apply_gradients(self, gradients):
+        """Updates the weights in place with one step of Adam, the way Keras Adam does."""
+
+        self.iterations += 1
+        t = self.iterations
+        step_size = np.float32(self.learning_rate * np.sqrt(1. - self.beta_2 ** t) / (1. - self.beta_1 ** t))
+        for w, g, m, v in zip(self.weights, gradients, self.moments, self.velocities):
+            m *= self.beta_1
+            m += (1. - self.beta_1) * g
+            v *= self.beta_2
+            v += (1. - self.beta_2) * np.square(g)
+            w -= step_size * m / (np.sqrt(v) + self.epsilon)
+
+    def fit(self, x, y=None, batch_size=32, epochs=1, verbose=0, sample_weight=None, steps_per_epoch=None):
+        """
+        Trains the model like the calls of Keras fit the agent makes, with train_on_batch.
+
+        Either x and y are the states and targets, split into batches of batch_size in order, or y is None and x is
+        an iterator of (states, targets) or (states, targets, sample weights) batches, steps_per_epoch of which make
+        an epoch.
+
+        Parameters:
+            x: The states of shape (number of samples, input size), or an iterator of batches
+            y (numpy.array): The targets of shape (number of samples, output size)
+            batch_size (int)
+            epochs (int)
+            verbose (int): Unused, nothing is printed
+            sample_weight (numpy.array): The weights of the samples, or None to weigh them all 1
+            steps_per_epoch (int): The number of batches of an epoch when x is an iterator
+
+        Returns:
+            list: The mean loss of the batches of each epoch, like history['loss'] of the History of Keras fit
+        """
+
+        epoch_losses = []
+        for _ in range(epochs):
+            if y is None:
+                losses = [self.train_on_batch(*batch) for _, batch in zip(range(steps_per_epoch), x)]
+            else:
+                losses = []
+                for start in range(0, len(x), batch_size):
+                    end = start + batch_size
+                    losses.append(self.train_on_batch(x[start:end], y[start:end],
+                                                      None if sample_weight is None else sample_weight[start:end]))
+            epoch_losses.append(float(np.mean(losses)))
+        return epoch_losses
+
+    def load_weights(self, file_path):
+        """
+        Loads the weights from an h5 file saved by Keras save_weights (or by save_weights).
+
+        Parameters:
+            file_path (string)
+        """
+
+        weights = []
+        with h5py.File(file_path, 'r') as f:
+            for layer_name in f.attrs['layer_names']:
+                g = f[layer_name.decode('utf8') if type(layer_name) == bytes else layer_name]
+                for weight_name in g.attrs['weight_names']:
+                    weights.append(g[weight_name.decode('utf8') if type(weight_name) == bytes else weight_name][()])
+        self.set_weights(weights)
+
+    def save_weights(self, file_path):
+        """
+        Saves the weights to an h5 file in the layout of Keras save_weights, so Keras models can load them.
+
+        Parameters:
+            file_path (string)
+        """
+
+        layer_names = ['dense', 'dense_1']
+        with h5py.File(file_path, 'w') as f:
+            f.attrs['layer_names'] = [name.encode('utf8') for name in layer_names]
+            # Keras reads these to convert weights between backends, the layout here is the tensorflow one
+            f.attrs['backend'] = b'tensorflow'
+            f.attrs['keras_version'] = b'2.4.0'
+            for i, layer_name in enumerate(layer_names):
+                g = f.create_group(layer_name)
+                weight_names = [layer_name + '/kernel:0', layer_name + '/bias:0']
+                g.attrs['weight_names'] = [name.encode('utf8') for name in weight_names]
+                for weight_name, w in zip(weight_names, self.weights[2 * i:2 * i + 2]):
+                    g.create_dataset(weight_name, data=w)
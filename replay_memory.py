@@ -0,0 +1,364 @@
+import numpy as np
+
+
+class PackedStateArray:
+    """
+    An array of states that stores the binary columns as bits, 8 to a byte, and the real valued columns as float32.
+
+    It is indexed like a (size, state size) float32 array, by an int or an array of ints, and the binary columns are
+    only exact for states whose binary columns are all 0 or 1.
+    """
+
+    def __init__(self, size, state_size, real_columns):
+        """
+        The constructor for PackedStateArray.
+
+        Parameters:
+            size (int): The number of states
+            state_size (int): The state representation size or length of numpy array
+            real_columns (numpy.array): The columns of the states that are not binary
+        """
+
+        self.state_size = state_size
+        self.real_columns = np.asarray(real_columns)
+        self.binary_columns = np.setdiff1d(np.arange(state_size), self.real_columns)
+        self.bits = np.zeros((size, (len(self.binary_columns) + 7) // 8), dtype=np.uint8)
+        self.reals = np.zeros((size, len(self.real_columns)), dtype=np.float32)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes + self.reals.nbytes
+
+    def __setitem__(self, index, states):
+        states = np.asarray(states)
+        self.bits[index] = np.packbits(states[..., self.binary_columns] != 0., axis=-1)
+        self.reals[index] = states[..., self.real_columns]
+
+    def __getitem__(self, index):
+        bits = self.bits[index]
+        states = np.empty(bits.shape[:-1] + (self.state_size,), dtype=np.float32)
+        states[..., self.binary_columns] = np.unpackbits(bits, axis=-1, count=len(self.binary_columns))
+        states[..., self.real_columns] = self.reals[index]
+        return states
+
+
+class ReplayMemory:
+    """A circular replay memory of experience tuples stored in preallocated numpy arrays."""
+
+    def __init__(self, max_size, state_size, real_columns=None):
+        """
+        The constructor for ReplayMemory.
+
+        The arrays are allocated with np.zeros, so their pages are only backed by memory once written.
+
+        Parameters:
+            max_size (int): The max number of experiences, the oldest one is overwritten past it
+            state_size (int): The state representation size or length of numpy array
+            real_columns (numpy.array): If given, the states are bit packed except for these columns, see
+                                        PackedStateArray. Default: None, the states are stored as float32
+        """
+
+        self.max_size = max_size
+        self.state_size = state_size
+        if real_columns is None:
+            self.states = np.zeros((max_size, state_size), dtype=np.float32)
+            self.next_states = np.zeros((max_size, state_size), dtype=np.float32)
+        else:
+            self.states = PackedStateArray(max_size, state_size, real_columns)
+            self.next_states = PackedStateArray(max_size, state_size, real_columns)
+        self.actions = np.zeros(max_size, dtype=np.int32)
+        self.rewards = np.zeros(max_size, dtype=np.float32)
+        self.dones = np.zeros(max_size, dtype=bool)
+        self.rng = np.random.default_rng()
+        self.clear()
+
+    def __len__(self):
+        return self.size
+
+    def is_full(self):
+        """Returns true if the memory is full."""
+
+        return self.size >= self.max_size
+
+    def clear(self):
+        """Empties the memory and resets the memory index (the arrays are kept)."""
+
+        self.size = 0
+        self.index = 0
+
+    def add(self, state, action, reward, next_state, done):
+        """
+        Adds an experience tuple made of the parameters to the memory.
+
+        Parameters:
+            state (numpy.array)
+            action (int)
+            reward (int)
+            next_state (numpy.array)
+            done (bool)
+        """
+
+        i = self.index
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.index = (i + 1) % self.max_size
+        if self.size < self.max_size:
+            self.size += 1
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        """
+        Adds experience tuples made of the rows of the parameters to the memory, each part copied in one go.
+
+        Parameters:
+            states (numpy.array)
+            actions (numpy.array)
+            rewards (numpy.array)
+            next_states (numpy.array)
+            dones (numpy.array)
+        """
+
+        count = len(actions)
+        # Only the last max_size experiences would remain anyway
+        skip = max(count - self.max_size, 0)
+        positions = (self.index + np.arange(skip, count)) % self.max_size
+        self.states[positions] = states[skip:]
+        self.actions[positions] = actions[skip:]
+        self.rewards[positions] = rewards[skip:]
+        self.next_states[positions] = next_states[skip:]
+        self.dones[positions] = dones[skip:]
+        self.index = (self.index + count) % self.max_size
+        self.size = min(self.size + count, self.max_size)
+
+    def sample_indices(self, batch_size):
+        """
+        Returns batch_size distinct random indices of stored experiences.
+
+        Parameters:
+            batch_size (int)
+
+        Returns:
+            numpy.array
+        """
+
+        return self.rng.choice(self.size, batch_size, replace=False)
+
+    def get_batch(self, indices):
+        """
+        Returns the experiences at the indices, each part stacked in an array.
+
+        Parameters:
+            indices (numpy.array)
+
+        Returns:
+            tuple: states, actions, rewards, next_states and dones arrays
+        """
+
+        return (self.states[indices], self.actions[indices], self.rewards[indices], self.next_states[indices],
+                self.dones[indices])
+
+    def get_weights(self, indices):
+        """
+        Returns the importance sampling weights of the experiences at the indices, None as sampling is uniform.
+
+        Parameters:
+            indices (numpy.array)
+
+        Returns:
+            None
+        """
+
+        return None
+
+    def update_priorities(self, indices, td_errors):
+        """
+        Updates the priorities of the experiences at the indices from their TD errors, sampling is uniform so it
+        does nothing.
+
+        Parameters:
+            indices (numpy.array)
+            td_errors (numpy.array)
+        """
+
+        pass
+
+    def sample(self, batch_size):
+        """
+        Returns a batch of batch_size random distinct experiences.
+
+        Parameters:
+            batch_size (int)
+
+        Returns:
+            tuple: states, actions, rewards, next_states and dones arrays
+        """
+
+        return self.get_batch(self.sample_indices(batch_size))
+
+
+class SumTree:
+    """A binary tree whose nodes hold the sum of their children, over the priorities of the leaves."""
+
+    def __init__(self, capacity):
+        """
+        The constructor for SumTree.
+
+        Parameters:
+            capacity (int): The number of leaves used, rounded up to a power of two in the tree
+        """
+
+        self.depth = max(int(np.ceil(np.log2(capacity))), 0)
+        self.num_leaves = 2 ** self.depth
+        # The root is node 0, the children of node i are nodes 2i + 1 and 2i + 2, the leaves are the last nodes
+        self.tree = np.zeros(2 * self.num_leaves - 1)
+
+    def total(self):
+        """Returns the sum of all the priorities."""
+
+        return self.tree[0]
+
+    def get(self, indices):
+        """
+        Returns the priorities of the leaves at the indices.
+
+        Parameters:
+            indices (numpy.array)
+
+        Returns:
+            numpy.array
+        """
+
+        return self.tree[indices + self.num_leaves - 1]
+
+    def update(self, indices, priorities):
+        """
+        Sets the priorities of the leaves at the indices and updates their ancestors, one level at a time.
+
+        Parameters:
+            indices (numpy.array)
+            priorities (numpy.array)
+        """
+
+        nodes = np.asarray(indices) + self.num_leaves - 1
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique((nodes - 1) // 2)
+            self.tree[nodes] = self.tree[2 * nodes + 1] + self.tree[2 * nodes + 2]
+
+    def clear(self):
+        self.tree[:] = 0.
+
+    def find(self, values):
+        """
+        Returns the leaves at which each value falls in the cumulative sum of the priorities.
+
+        Parameters:
+            values (numpy.array): Values in [0, total)
+
+        Returns:
+            numpy.array: The indices of the leaves
+        """
+
+        nodes = np.zeros(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes + 1
+            left_sums = self.tree[left]
+            go_right = values >= left_sums
+            values = np.where(go_right, values - left_sums, values)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - (self.num_leaves - 1)
+
+
+class PrioritizedReplayMemory(ReplayMemory):
+    """A replay memory that samples experiences in proportion to their priority, from a sum tree of priorities."""
+
+    def __init__(self, max_size, state_size, alpha, beta, beta_increment, epsilon=1e-6, real_columns=None):
+        """
+        The constructor for PrioritizedReplayMemory.
+
+        The priority of an experience is (|TD error| + epsilon) ** alpha, new experiences get the max priority so far
+        so that they are sampled at least once.
+
+        Parameters:
+            max_size (int): The max number of experiences, the oldest one is overwritten past it
+            state_size (int): The state representation size or length of numpy array
+            alpha (float): How much the priorities count, 0 for uniform sampling
+            beta (float): The initial importance sampling exponent, 1 for full correction of the sampling bias
+            beta_increment (float): Added to beta after each sampled batch, up to 1
+            epsilon (float): Keeps the priorities above zero
+            real_columns (numpy.array): If given, the states are bit packed except for these columns
+        """
+
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.tree = SumTree(max_size)
+        super().__init__(max_size, state_size, real_columns)
+
+    def clear(self):
+        """Empties the memory, resets the memory index and the priorities (the arrays are kept)."""
+
+        super().clear()
+        self.tree.clear()
+        self.max_priority = 1.
+
+    def add(self, state, action, reward, next_state, done):
+        i = self.index
+        super().add(state, action, reward, next_state, done)
+        self.tree.update(np.array([i]), self.max_priority)
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        count = min(len(actions), self.max_size)
+        positions = (self.index + len(actions) - count + np.arange(count)) % self.max_size
+        super().add_batch(states, actions, rewards, next_states, dones)
+        self.tree.update(positions, self.max_priority)
+
+    def sample_indices(self, batch_size):
+        """
+        Returns batch_size random indices of stored experiences, drawn in proportion to their priority.
+
+        The priority range is split in batch_size equal segments and one index is drawn from each.
+
+        Parameters:
+            batch_size (int)
+
+        Returns:
+            numpy.array
+        """
+
+        segment = self.tree.total() / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        # Rounding can land past the last stored experience
+        return np.minimum(self.tree.find(values), self.size - 1)
+
+    def get_weights(self, indices):
+        """
+        Returns the importance sampling weights of the experiences at the indices, scaled to a max of 1.
+
+        Parameters:
+            indices (numpy.array)
+
+        Returns:
+            numpy.array
+        """
+
+        probabilities = self.tree.get(indices) / self.tree.total()
+        weights = (self.size * probabilities) ** -self.beta
+        self.beta = min(1., self.beta + self.beta_increment)
+        return (weights / weights.max()).astype(np.float32)
+
+    def update_priorities(self, indices, td_errors):
+        """
+        Updates the priorities of the experiences at the indices from their TD errors.
+
+        Parameters:
+            indices (numpy.array)
+            td_errors (numpy.array)
+        """
+
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        self.tree.update(indices, priorities)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
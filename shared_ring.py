@@ -0,0 +1,143 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+
+class SharedTransitionRing:
+    """A single producer, single consumer ring of experiences in a fixed layout in shared memory."""
+
+    def __init__(self, capacity, state_size, context=multiprocessing):
+        """
+        The constructor for SharedTransitionRing, which creates (and owns) the shared memory block.
+
+        The ring can be passed to a child process as a Process argument, the child attaches to the same block.
+
+        Parameters:
+            capacity (int): The max number of experiences written but not yet read
+            state_size (int): The state representation size or length of numpy array
+            context: The multiprocessing context the processes are started with
+        """
+
+        self.capacity = capacity
+        self.state_size = state_size
+        # The head (written count) and tail (read count) counters are read and set under the lock
+        self.lock = context.Lock()
+        self.shm = shared_memory.SharedMemory(create=True, size=self._get_layout()[1])
+        self.owner = True
+        self._attach()
+        self._cache_counters()
+
+    def _get_layout(self):
+        """Returns the (name, dtype, shape, offset) of each array in the block and the size of the block."""
+
+        arrays = [('counters', np.int64, (2,)), ('states', np.float32, (self.capacity, self.state_size)),
+                  ('next_states', np.float32, (self.capacity, self.state_size)),
+                  ('actions', np.int32, (self.capacity,)), ('rewards', np.float32, (self.capacity,)),
+                  ('dones', np.bool_, (self.capacity,))]
+        layout = []
+        offset = 0
+        for name, dtype, shape in arrays:
+            layout.append((name, dtype, shape, offset))
+            offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+            # Keep every array 8 byte aligned
+            offset = (offset + 7) // 8 * 8
+        return layout, offset
+
+    def _attach(self):
+        for name, dtype, shape, offset in self._get_layout()[0]:
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset))
+
+    def _cache_counters(self):
+        # The producer is the only writer of head, it keeps the rows it wrote to itself until it publishes them and
+        # only needs to read tail again when the ring looks full
+        with self.lock:
+            self.head, self.tail = int(self.counters[0]), int(self.counters[1])
+
+    def __getstate__(self):
+        return {'capacity': self.capacity, 'state_size': self.state_size, 'lock': self.lock, 'name': self.shm.name}
+
+    def __setstate__(self, state):
+        self.capacity = state['capacity']
+        self.state_size = state['state_size']
+        self.lock = state['lock']
+        self.shm = shared_memory.SharedMemory(name=state['name'])
+        self.owner = False
+        self._attach()
+        self._cache_counters()
+
+    def __len__(self):
+        with self.lock:
+            return int(self.counters[0] - self.counters[1])
+
+    def put(self, state, action, reward, next_state, done):
+        """
+        Writes an experience into the ring, called by the producer only.
+
+        The experience is only seen by the consumer once published, see publish.
+
+        Parameters:
+            state (numpy.array)
+            action (int)
+            reward (int)
+            next_state (numpy.array)
+            done (bool)
+
+        Returns:
+            bool: False if the ring is full and nothing was written
+        """
+
+        head = self.head
+        if head - self.tail >= self.capacity:
+            # Let the consumer read what was written so far, it may be waiting for it to free rows
+            self.publish()
+            with self.lock:
+                self.tail = int(self.counters[1])
+            if head - self.tail >= self.capacity:
+                return False
+        i = head % self.capacity
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.head = head + 1
+        return True
+
+    def publish(self):
+        """Makes the experiences written so far visible to the consumer, called by the producer only."""
+
+        with self.lock:
+            self.counters[0] = self.head
+
+    def drain_into(self, dqn_agent):
+        """
+        Adds all the written experiences to the agent's memory straight from the shared rows, called by the consumer only.
+
+        Parameters:
+            dqn_agent (DQNAgent)
+
+        Returns:
+            int: The number of experiences read
+        """
+
+        with self.lock:
+            head, tail = int(self.counters[0]), int(self.counters[1])
+        count = head - tail
+        start = tail % self.capacity
+        # The written rows are in at most two segments, before and after the end of the ring
+        for begin, end in ((start, min(start + count, self.capacity)), (0, max(start + count - self.capacity, 0))):
+            if end > begin:
+                dqn_agent.add_experiences(self.states[begin:end], self.actions[begin:end], self.rewards[begin:end],
+                                          self.next_states[begin:end], self.dones[begin:end])
+        with self.lock:
+            self.counters[1] = head
+        return count
+
+    def close(self):
+        """Detaches from the shared memory block and frees it if this is the process that created it."""
+
+        for name, _, _, _ in self._get_layout()[0]:
+            setattr(self, name, None)
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
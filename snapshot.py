@@ -0,0 +1,349 @@
+import argparse
+import json
+import os
+import sys
+import numpy as np
+
+from catalog import Catalog
+from dialog_reader import DialogReader
+
+SNAPSHOT_VERSION = 1
+# The file path constants of the data files compiled into a snapshot
+SOURCE_KEYS = ['database', 'size_database', 'dict', 'size_dict', 'user_goals', 'dialogs']
+
+# Node kinds of the encoded JSON values
+_STR, _INT, _FLOAT, _BOOL, _NONE, _LIST, _DICT = range(7)
+
+
+def _is_streamed(file_path_dict):
+    """Returns True if the dialogs are a JSONL file, read on demand by DialogReader rather than kept in the snapshot."""
+
+    return file_path_dict['dialogs'].endswith('.jsonl')
+
+
+def _source_stamps(file_path_dict):
+    """Returns the path, size and modification time of each data file, to tell if a snapshot is out of date."""
+
+    stamps = {}
+    for key in SOURCE_KEYS:
+        if key == 'dialogs' and _is_streamed(file_path_dict):
+            continue
+        stat = os.stat(file_path_dict[key])
+        stamps[key] = [file_path_dict[key], stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+
+class _Encoder:
+    """Encodes JSON values into a table of nodes, with every distinct string (value or key) saved once."""
+
+    def __init__(self):
+        self.string_ids = {}
+        self.strings = []
+        # Per node: its kind, its value (string id, number, or start of its children) and its number of children
+        self.kinds = []
+        self.values = []
+        self.sizes = []
+        # The node ids of the children of list and dict nodes, each node's in a contiguous range, with their key
+        # string ids (-1 in lists)
+        self.children = []
+        self.child_keys = []
+
+    def add_string(self, string):
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = self.string_ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def add(self, value):
+        """
+        Adds the nodes of a JSON value.
+
+        Parameters:
+            value: A value as loaded by json.load
+
+        Returns:
+            int: The id of the root node of the value
+        """
+
+        if type(value) == str:
+            kind, encoded, size = _STR, self.add_string(value), 0
+        elif type(value) == bool:
+            kind, encoded, size = _BOOL, int(value), 0
+        elif type(value) == int:
+            kind, encoded, size = _INT, value, 0
+        elif type(value) == float:
+            kind, encoded, size = _FLOAT, int(np.float64(value).view(np.int64)), 0
+        elif value is None:
+            kind, encoded, size = _NONE, 0, 0
+        elif type(value) in (list, dict):
+            items = value.items() if type(value) == dict else [(None, item) for item in value]
+            # The children are added first so that this node's child ids are contiguous
+            child_ids = [(key, self.add(item)) for key, item in items]
+            kind, encoded, size = _DICT if type(value) == dict else _LIST, len(self.children), len(child_ids)
+            for key, child_id in child_ids:
+                self.children.append(child_id)
+                self.child_keys.append(-1 if key is None else self.add_string(key))
+        else:
+            raise ValueError('Cannot encode a value of type {}!'.format(type(value).__name__))
+        self.kinds.append(kind)
+        self.values.append(encoded)
+        self.sizes.append(size)
+        return len(self.kinds) - 1
+
+    def save(self, directory):
+        encoded = [string.encode('utf8') for string in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(string) for string in encoded])
+        np.save(os.path.join(directory, 'strings.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        np.save(os.path.join(directory, 'string_offsets.npy'), offsets)
+        np.save(os.path.join(directory, 'kinds.npy'), np.array(self.kinds, dtype=np.uint8))
+        np.save(os.path.join(directory, 'values.npy'), np.array(self.values, dtype=np.int64))
+        np.save(os.path.join(directory, 'sizes.npy'), np.array(self.sizes, dtype=np.int32))
+        np.save(os.path.join(directory, 'children.npy'), np.array(self.children, dtype=np.int32))
+        np.save(os.path.join(directory, 'child_keys.npy'), np.array(self.child_keys, dtype=np.int32))
+
+
+def compile_snapshot(file_path_dict, directory):
+    """
+    Compiles the databases, dicts, goals and dialogs into a snapshot directory of .npy files.
+
+    The databases are saved as the columns and postings of their catalogs, the goals and dialogs as tables of nodes, so
+    that loading them is memory mapping the arrays. JSONL dialogs are left out, DialogReader reads them on demand.
+    The manifest is written last, a snapshot without one is incomplete.
+
+    Parameters:
+        file_path_dict (dict): The file path constants (db_file_paths)
+        directory (string): The snapshot directory, created if needed
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    stamps = _source_stamps(file_path_dict)
+
+    def load(key):
+        with open(file_path_dict[key], encoding='utf-8') as f:
+            return json.load(f)
+
+    encoder = _Encoder()
+    manifest = {'version': SNAPSHOT_VERSION, 'sources': stamps, 'catalogs': {}}
+    for name, dict_key in (('database', 'dict'), ('size_database', 'size_dict')):
+        catalog = Catalog(load(name), load(dict_key))
+        posting_keys = list(catalog.postings)
+        meta = {'num_rows': catalog.num_rows, 'slots': catalog.slots,
+                'vocab': [catalog.vocab[slot] for slot in catalog.slots], 'slot_values': catalog.slot_values,
+                'postings': [list(key) for key in posting_keys]}
+        manifest['catalogs'][name] = encoder.add(meta)
+        columns = catalog.column_matrix()
+        posting_offsets = np.zeros(len(posting_keys) + 1, dtype=np.int64)
+        posting_offsets[1:] = np.cumsum([len(catalog.postings[key]) for key in posting_keys])
+        posting_rows = np.concatenate([catalog.postings[key] for key in posting_keys] + [np.empty(0, dtype=np.int64)])
+        np.save(os.path.join(directory, name + '_columns.npy'), columns)
+        np.save(os.path.join(directory, name + '_posting_offsets.npy'), posting_offsets)
+        np.save(os.path.join(directory, name + '_posting_rows.npy'), posting_rows.astype(np.int64))
+    for name in ('user_goals', 'dialogs'):
+        if name == 'dialogs' and _is_streamed(file_path_dict):
+            continue
+        roots = [encoder.add(item) for item in load(name)]
+        np.save(os.path.join(directory, name + '_roots.npy'), np.array(roots, dtype=np.int64))
+    encoder.save(directory)
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+
+
+def is_snapshot_fresh(directory, file_path_dict):
+    """
+    Returns True if the snapshot directory holds a complete snapshot of the current data files.
+
+    Parameters:
+        directory (string)
+        file_path_dict (dict): The file path constants (db_file_paths)
+
+    Returns:
+        bool
+    """
+
+    manifest_path = os.path.join(directory, 'manifest.json')
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return manifest['version'] == SNAPSHOT_VERSION and manifest['sources'] == _source_stamps(file_path_dict)
+
+
+class Snapshot:
+    """A compiled snapshot of the data files, its arrays are memory mapped and its goals and dialogs decoded on access."""
+
+    def __init__(self, directory):
+        """
+        The constructor for Snapshot.
+
+        Parameters:
+            directory (string): A snapshot directory written by compile_snapshot
+        """
+
+        self.directory = directory
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        if self.manifest['version'] != SNAPSHOT_VERSION:
+            raise ValueError('Snapshot version {} is not {}!'.format(self.manifest['version'], SNAPSHOT_VERSION))
+        blob = bytes(self._load('strings'))
+        offsets = self._load('string_offsets').tolist()
+        self.strings = [sys.intern(blob[start:end].decode('utf8')) for start, end in zip(offsets, offsets[1:])]
+        self.kinds = self._load('kinds')
+        self.values = self._load('values')
+        self.sizes = self._load('sizes')
+        self.children = self._load('children')
+        self.child_keys = self._load('child_keys')
+
+    def _load(self, name):
+        # A plain ndarray view of the memory map, indexing a numpy.memmap is slower
+        return np.asarray(np.load(os.path.join(self.directory, name + '.npy'), mmap_mode='r'))
+
+    def __getstate__(self):
+        # Processes reopen the snapshot rather than receive copies of its arrays
+        return {'directory': self.directory}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'])
+
+    def decode(self, node):
+        """
+        Returns the JSON value of a node, with new lists and dicts.
+
+        Parameters:
+            node (int)
+
+        Returns:
+            The value as json.load would give it
+        """
+
+        kind = self.kinds[node]
+        value = int(self.values[node])
+        if kind == _STR:
+            return self.strings[value]
+        if kind == _INT:
+            return value
+        if kind == _FLOAT:
+            return float(np.int64(value).view(np.float64))
+        if kind == _BOOL:
+            return bool(value)
+        if kind == _NONE:
+            return None
+        end = value + int(self.sizes[node])
+        children = self.children[value:end].tolist()
+        if kind == _LIST:
+            return [self.decode(child) for child in children]
+        keys = self.child_keys[value:end].tolist()
+        return {self.strings[key]: self.decode(child) for key, child in zip(keys, children)}
+
+    def catalog(self, name):
+        """
+        Returns the catalog of a database, its columns and postings are views of the memory mapped arrays.
+
+        Parameters:
+            name (string): 'database' or 'size_database'
+
+        Returns:
+            Catalog
+        """
+
+        meta = self.decode(self.manifest['catalogs'][name])
+        slots = meta['slots']
+        matrix = self._load(name + '_columns')
+        offsets = self._load(name + '_posting_offsets').tolist()
+        rows = self._load(name + '_posting_rows')
+        columns = {slot: matrix[i] for i, slot in enumerate(slots)}
+        postings = {(slot, folded): rows[offsets[k]:offsets[k + 1]]
+                    for k, (slot, folded) in enumerate(meta['postings'])}
+        return Catalog.from_parts(meta['num_rows'], slots, dict(zip(slots, meta['vocab'])), columns, postings,
+                                  meta['slot_values'])
+
+    def list(self, name):
+        """
+        Returns a list of the snapshot whose items are decoded on access.
+
+        Parameters:
+            name (string): 'user_goals' or 'dialogs'
+
+        Returns:
+            SnapshotList
+        """
+
+        return SnapshotList(self, name)
+
+
+class SnapshotList:
+    """A read only list of the goals or dialogs of a snapshot, each access decodes a new copy of the item."""
+
+    def __init__(self, snapshot, name):
+        self.snapshot = snapshot
+        self.name = name
+        self.roots = snapshot._load(name + '_roots')
+
+    def __getstate__(self):
+        return {'snapshot': self.snapshot, 'name': self.name}
+
+    def __setstate__(self, state):
+        self.__init__(state['snapshot'], state['name'])
+
+    def __len__(self):
+        return len(self.roots)
+
+    def __getitem__(self, index):
+        if type(index) == slice:
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.snapshot.decode(self.roots[index])
+
+    def __iter__(self):
+        for root in self.roots.tolist():
+            yield self.snapshot.decode(root)
+
+
+def load_data(file_path_dict):
+    """
+    Returns the databases as catalogs, the user goals and the dialogs.
+
+    They are loaded from the snapshot directory if it holds an up to date snapshot, else from the json files. JSONL
+    dialogs are always read on demand by a DialogReader.
+
+    Parameters:
+        file_path_dict (dict): The file path constants (db_file_paths)
+
+    Returns:
+        tuple: database (Catalog), size_database (Catalog), user_goals (list) and dialogs (list)
+    """
+
+    dialogs = DialogReader(file_path_dict['dialogs']) if _is_streamed(file_path_dict) else None
+    directory = file_path_dict['snapshot']
+    if is_snapshot_fresh(directory, file_path_dict):
+        snapshot = Snapshot(directory)
+        if dialogs is None:
+            dialogs = snapshot.list('dialogs')
+        return snapshot.catalog('database'), snapshot.catalog('size_database'), snapshot.list('user_goals'), dialogs
+
+    def load(key):
+        with open(file_path_dict[key], encoding='utf-8') as f:
+            return json.load(f)
+
+    if dialogs is None:
+        dialogs = load('dialogs')
+    return (Catalog(load('database'), load('dict')), Catalog(load('size_database'), load('size_dict')),
+            load('user_goals'), dialogs)
+
+
+if __name__ == "__main__":
+    # Compile the data files of the constants file into the snapshot directory of its db_file_paths
+    # In terminal: python snapshot.py --constants_path "constants.json"
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--constants_path', dest='constants_path', type=str, default='constants.json')
+    args = parser.parse_args()
+
+    with open(args.constants_path) as f:
+        constants = json.load(f)
+    file_path_dict = constants['db_file_paths']
+    compile_snapshot(file_path_dict, file_path_dict['snapshot'])
+    print('Snapshot compiled to {}'.format(file_path_dict['snapshot']))
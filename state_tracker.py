@@ -3,12 +3,59 @@ import time
 import numpy as np
 import random
 
-from utils import DEBUG_PRINT, SAVE_LOG
+from utils import DEBUG_PRINT, DEBUG_ENABLED, SAVE_LOG
 from utils import convert_list_to_dict
 from db_query import DBQuery
 from dialogue_config import all_intents, all_slots, usersim_default_key
 from dialogue_config import request_product_entity
 
+# Checked once, so the DEBUG_PRINT calls of this module cost nothing while it is off
+_DEBUG = DEBUG_ENABLED(__name__)
+# The blocks of the state representation that are not binary, the turn and the scaled KB counts
+REAL_VALUED_BLOCKS = ('turn', 'kb_count')
+
+
+def get_state_slices(max_round_num):
+    """
+    Returns the slice of each block of the state representation, in the order they are laid out by get_state.
+
+    Parameters:
+        max_round_num (int): The max number of rounds, the size of the turn one-hot block
+
+    Returns:
+        dict: The block names with their slices in the state representation
+    """
+
+    num_intents = len(all_intents)
+    num_slots = len(all_slots)
+    block_sizes = [('user_act', num_intents), ('user_inform_slots', num_slots), ('user_request_slots', num_slots),
+                   ('agent_act', num_intents), ('agent_inform_slots', num_slots), ('agent_request_slots', num_slots),
+                   ('current_informs_slots', num_slots), ('turn', 1), ('turn_onehot', max_round_num),
+                   ('kb_binary', num_slots + 1), ('kb_count', num_slots + 1)]
+    state_slices = {}
+    offset = 0
+    for name, size in block_sizes:
+        state_slices[name] = slice(offset, offset + size)
+        offset += size
+    return state_slices
+
+
+def get_real_valued_columns(max_round_num):
+    """
+    Returns the columns of the state representation that are not binary, see REAL_VALUED_BLOCKS.
+
+    Parameters:
+        max_round_num (int): The max number of rounds, the size of the turn one-hot block
+
+    Returns:
+        numpy.array
+    """
+
+    state_slices = get_state_slices(max_round_num)
+    return np.concatenate([np.arange(state_slices[name].start, state_slices[name].stop)
+                           for name in REAL_VALUED_BLOCKS])
+
+
 class StateTracker:
     """Tracks the state of the episode/conversation and prepares the state representation for the agent."""
 
@@ -20,19 +67,28 @@ class StateTracker:
         calls reset.
 
         Parameters:
-            database (dict): The database with format dict(long: dict)
+            database (list or Catalog): The database with format list(dict)
+            size_database (list or Catalog): The size database with format list(dict)
             constants (dict): Loaded constants in dict
 
         """
 
-        self.db_helper = DBQuery(database, size_database)
+        self.db_helper = DBQuery(database, size_database, constants)
         self.match_key = usersim_default_key
         self.intents_dict = convert_list_to_dict(all_intents)
         self.num_intents = len(all_intents)
         self.slots_dict = convert_list_to_dict(all_slots)
         self.num_slots = len(all_slots)
         self.max_round_num = constants['run']['max_round_num']
-        self.none_state = np.zeros(self.get_state_size())
+        self.state_size = self.get_state_size()
+        self.none_state = np.zeros(self.state_size)
+        self.state_slices = self._get_state_slices()
+        # The user action blocks and the agent action blocks have the same layout
+        self.user_action_slice = slice(self.state_slices['user_act'].start, self.state_slices['user_request_slots'].stop)
+        self.agent_action_slice = slice(self.state_slices['agent_act'].start,
+                                        self.state_slices['agent_request_slots'].stop)
+        # The state representation, kept up to date by the update methods and the KB blocks by get_state
+        self.state_rep = np.zeros(self.state_size)
         self.reset()
 
     def reset(self):
@@ -43,6 +99,40 @@ class StateTracker:
         # A list of the dialogues (dicts) by the agent and user so far in the conversation
         self.history = []
         self.round_num = 0
+        self.state_rep[:] = 0.
+        # Whether current_informs changed since the KB blocks were last computed
+        self.kb_outdated = True
+
+    def _append_history(self, action):
+        """
+        Appends an action to the history and updates the action blocks of the state representation.
+
+        The last action so far becomes the previous action (the agent action blocks) and the new action is encoded in
+        the user action blocks.
+
+        Parameters:
+            action (dict): The action of format dict('intent': string, 'inform_slots': dict, 'request_slots': dict)
+        """
+
+        self.history.append(action)
+        state_slices = self.state_slices
+        self.state_rep[self.agent_action_slice] = self.state_rep[self.user_action_slice]
+        self.state_rep[self.user_action_slice] = 0.
+        self.state_rep[state_slices['user_act']][self.intents_dict[action['intent']]] = 1.0
+        user_inform_slots_rep = self.state_rep[state_slices['user_inform_slots']]
+        for key in action['inform_slots'].keys():
+            user_inform_slots_rep[self.slots_dict[key]] = 1.0
+        user_request_slots_rep = self.state_rep[state_slices['user_request_slots']]
+        for key in action['request_slots'].keys():
+            user_request_slots_rep[self.slots_dict[key]] = 1.0
+
+    def _set_current_inform(self, key, value):
+        """Sets a current inform, and updates the current informs block and marks the KB blocks outdated."""
+
+        if key not in self.current_informs or self.current_informs[key] != value:
+            self.kb_outdated = True
+        self.current_informs[key] = value
+        self.state_rep[self.state_slices['current_informs_slots']][self.slots_dict[key]] = 1.0
 
     def get_state_size(self):
         """Returns the state size of the state representation used by the agent."""
@@ -52,111 +142,86 @@ class StateTracker:
         # DEBUG_PRINT("state_size = ", state_size)
         return state_size
 
-    def get_state(self, done=False):
+    def _get_state_slices(self):
+        """
+        Returns the slice of each block of the state representation, in the order they are laid out by get_state.
+
+        Returns:
+            dict: The block names with their slices in the state representation
+        """
+
+        state_slices = get_state_slices(self.max_round_num)
+        assert max(block.stop for block in state_slices.values()) == self.state_size
+        return state_slices
+
+    def get_state(self, done=False, out=None):
         """
         Returns the state representation as a numpy array which is fed into the agent's neural network.
 
         The state representation contains useful information for the agent about the current state of the conversation.
         Processes by the agent to be fed into the neural network. Ripe for experimentation and optimization.
 
+        The action, current informs and turn blocks are kept up to date by the update methods, the KB blocks are
+        recomputed only if current_informs changed since the last call.
+
         Parameters:
             done (bool): Indicates whether this is the last dialogue in the episode/conversation. Default: False
+            out (numpy.array): An array of shape (state size,) to write the state into, such as a row of a batch
+                               matrix. Default: a new array
 
         Returns:
-            numpy.array: A numpy array of shape (state size,)
+            numpy.array: A numpy array of shape (state size,), out if it is given
 
         """
 
         # If done then fill state with zeros
         if done:
-            return self.none_state
+            if out is None:
+                return self.none_state
+            out[:] = 0.
+            return out
+
+        if _DEBUG:
+            DEBUG_PRINT(self.history[-1])
+        if self.kb_outdated:
+            self._update_kb_rep()
+
+        if out is None:
+            out = self.state_rep.copy()
+        else:
+            out[:] = self.state_rep
+        # The layout of the blocks is given by self.state_slices
+        # DEBUG_PRINT("-----state-----")
+        if _DEBUG:
+            DEBUG_PRINT(out)
+        return out
+
+    def _update_kb_rep(self):
+        """Recomputes the KB blocks of the state representation from current_informs."""
 
-        # DEBUG_PRINT("len history = ", len(self.history))
-        # Get last user action
-        user_action = self.history[-1]
-        DEBUG_PRINT(user_action)
         # Check with all slots are informed by user, finding a product in database is exist
         db_results_dict = self.db_helper.get_db_results_for_slots(self.current_informs)
-        DEBUG_PRINT("db_results_dict = ", db_results_dict)
-
-        last_agent_action = self.history[-2] if len(self.history) > 1 else None
-        DEBUG_PRINT(last_agent_action)
-
-        # Create one-hot of intents to represent the current user action
-        user_act_rep = np.zeros((self.num_intents,))
-        user_act_rep[self.intents_dict[user_action['intent']]] = 1.0
-
-        # Create bag of inform slots representation to represent the current user action
-        user_inform_slots_rep = np.zeros((self.num_slots,))
-        for key in user_action['inform_slots'].keys():
-            user_inform_slots_rep[self.slots_dict[key]] = 1.0
-
-        # Create bag of request slots representation to represent the current user action
-        user_request_slots_rep = np.zeros((self.num_slots,))
-        for key in user_action['request_slots'].keys():
-            user_request_slots_rep[self.slots_dict[key]] = 1.0
-
-        # Create bag of filled_in slots based on the current_informs
-        current_informs_slots_rep = np.zeros((self.num_slots,))
-        for key in self.current_informs:
-            current_informs_slots_rep[self.slots_dict[key]] = 1.0
-
-        # Create one-hot of intents to represent the last agent action
-        agent_act_rep = np.zeros((self.num_intents,))
-        if last_agent_action:
-            agent_act_rep[self.intents_dict[last_agent_action['intent']]] = 1.0
-
-        # Create bag of inform slots representation to represent the last agent action
-        agent_inform_slots_rep = np.zeros((self.num_slots,))
-        if last_agent_action:
-            for key in last_agent_action['inform_slots'].keys():
-                agent_inform_slots_rep[self.slots_dict[key]] = 1.0
-
-        # Create bag of request slots representation to represent the last agent action
-        agent_request_slots_rep = np.zeros((self.num_slots,))
-        if last_agent_action:
-            for key in last_agent_action['request_slots'].keys():
-                agent_request_slots_rep[self.slots_dict[key]] = 1.0
-
-        # Create bag of filled_in slots based on the current_requests
-        # current_requests_slots_rep = np.zeros((self.num_slots,))
-        # for key in self.current_requests:
-        #     current_requests_slots_rep[self.slots_dict[key]] = 1.0
-
-        # Value representation of the round num
-        turn_rep = np.zeros((1,)) + self.round_num / 5.
-
-        # One-hot representation of the round num
-        turn_onehot_rep = np.zeros((self.max_round_num,))
-        turn_onehot_rep[self.round_num - 1] = 1.0
+        if _DEBUG:
+            DEBUG_PRINT("db_results_dict = ", db_results_dict)
 
         # Representation of DB query results (scaled counts)
-        kb_count_rep = np.zeros((self.num_slots + 1,)) + db_results_dict['matching_all_constraints'] / 100.
+        kb_count_rep = self.state_rep[self.state_slices['kb_count']]
+        kb_count_rep[:] = db_results_dict['matching_all_constraints'] / 100.
         for key in db_results_dict.keys():
             if key in self.slots_dict:
                 kb_count_rep[self.slots_dict[key]] = db_results_dict[key] / 100.
-        DEBUG_PRINT(kb_count_rep)
+        if _DEBUG:
+            DEBUG_PRINT(kb_count_rep)
 
         # Representation of DB query results (binary)
-        kb_binary_rep = np.zeros((self.num_slots + 1,)) + np.sum(db_results_dict['matching_all_constraints'] > 0.)
+        kb_binary_rep = self.state_rep[self.state_slices['kb_binary']]
+        kb_binary_rep[:] = np.sum(db_results_dict['matching_all_constraints'] > 0.)
         for key in db_results_dict.keys():
             if key in self.slots_dict:
                 kb_binary_rep[self.slots_dict[key]] = np.sum(db_results_dict[key] > 0.)
         # DEBUG_PRINT(kb_binary_rep)
 
-        state_representation = np.hstack(
-            [user_act_rep, user_inform_slots_rep, user_request_slots_rep, # 6/7/7
-            agent_act_rep, agent_inform_slots_rep, agent_request_slots_rep, # 6/7/7
-            current_informs_slots_rep, # 7
-            # current_requests_slots_rep, # 6/6
-            # current_informs_slots_rep, # 6/6
-            turn_rep, turn_onehot_rep, # 1/20
-            kb_binary_rep, kb_count_rep # 7/7
-            ]).flatten()
-        # DEBUG_PRINT("-----state-----")
-        DEBUG_PRINT(state_representation)
-        # DEBUG_PRINT("size state_representation = ", len(state_representation))
-        return state_representation
+        self.kb_outdated = False
 
     def update_state_user(self, user_action):
         """
@@ -173,14 +238,22 @@ class StateTracker:
         # Keep track all key are informed by user.
         # Replace the value if user informed it again.
         for key, value in user_action['inform_slots'].items():
-            self.current_informs[key] = value
+            self._set_current_inform(key, value)
         # Keep track all key are requested by user to force agent answer.
         # Need to delete if agent informed.
         # for key, value in user_action['request_slots'].items():
         #     self.current_requests.append(key)
         user_action.update({'round': self.round_num, 'speaker': 'User'})
-        self.history.append(user_action)
+        self._append_history(user_action)
+        # Shift the one-hot of the round num (the round past the max round only comes with done)
+        turn_onehot_rep = self.state_rep[self.state_slices['turn_onehot']]
+        if self.round_num > 0:
+            turn_onehot_rep[self.round_num - 1] = 0.
         self.round_num += 1
+        if self.round_num <= self.max_round_num:
+            turn_onehot_rep[self.round_num - 1] = 1.0
+        # Value representation of the round num
+        self.state_rep[self.state_slices['turn']] = self.round_num / 5.
 
 
     """Warmup phase."""
@@ -206,7 +279,7 @@ class StateTracker:
                 if self.current_requests.__contains__(slot):
                     self.current_requests.remove(slot)
             agent_action.update({'round': self.round_num, 'speaker': 'Agent'})
-            self.history.append(agent_action)
+            self._append_history(agent_action)
 
 
     """Training phase."""
@@ -242,7 +315,7 @@ class StateTracker:
             #         agent_action['inform_slots'][key] = value
             # self.current_informs[key] = value
             if type(value) != list and value != 'no match available':
-                self.current_informs[key] = value
+                self._set_current_inform(key, value)
             # for slot in agent_action['inform_slots']:
             #     if self.current_requests.__contains__(slot):
             #         self.current_requests.remove(slot)
@@ -262,10 +335,10 @@ class StateTracker:
                 agent_action['inform_slots'][self.match_key] = str(agent_action['inform_slots'])
             else:
                 agent_action['inform_slots'][self.match_key] = 'no match available'
-            self.current_informs[self.match_key] = agent_action['inform_slots'][self.match_key]
+            self._set_current_inform(self.match_key, agent_action['inform_slots'][self.match_key])
         # DEBUG_PRINT("agent:\t", agent_action)
         agent_action.update({'round': self.round_num, 'speaker': 'Agent'})
-        self.history.append(agent_action)
+        self._append_history(agent_action)
 
 
     """Testing phase."""
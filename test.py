@@ -4,6 +4,7 @@ import json
 import random
 
 from utils import DEBUG_PRINT, SAVE_LOG
+from snapshot import load_data
 from user import User
 from dqn_agent import DQNAgent
 from state_tracker import StateTracker
@@ -44,19 +45,9 @@ if __name__ == "__main__":
     TRAIN_FREQ = run_dict['train_freq']
     SUCCESS_RATE_THRESHOLD = run_dict['success_rate_threshold']
 
-    # Load product DB
-    database= json.load(open(DATABASE_FILE_PATH, encoding='utf-8'))
-    # Load size DB
-    size_database= json.load(open(SIZE_DATABASE_FILE_PATH, encoding='utf-8'))
-
-    # Load product dict
-    # db_dict = json.load(open(DICT_FILE_PATH, encoding='utf-8'))
-
-    # Load goal File
-    user_goals = json.load(open(USER_GOALS_FILE_PATH, encoding='utf-8'))
-
-    # Load dialogs File
-    dialogs = json.load(open(DIALOG_FILE_PATH, encoding='utf-8'))
+    # Load the product and size DBs into columnar catalogs, the goals and the dialogs, from the snapshot compiled by
+    # snapshot.py if it is up to date with the files
+    database, size_database, user_goals, dialogs = load_data(file_path_dict)
 
     # Init. Objects
     if USE_USERSIM:
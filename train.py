@@ -3,11 +3,19 @@ import time
 import json
 import random
 
-from utils import DEBUG_PRINT, SAVE_LOG
+from utils import DEBUG_PRINT, DEBUG_ENABLED, SAVE_LOG, FLUSH_LOG
+from snapshot import load_data
 from user_simulator import UserSimulator
 from error_model_controller import ErrorModelController
 from dqn_agent import DQNAgent
 from state_tracker import StateTracker
+from vec_env import VecEnv
+from actor_learner import ActorLearner
+from warmup_cache import load_warmup
+from warmup_loop import run_warmup
+
+# Checked once, so the DEBUG_PRINT calls of this module cost nothing while it is off
+_DEBUG = DEBUG_ENABLED(__name__)
 
 if __name__ == "__main__":
     # Can provide constants file path in args OR run it as is and change 'CONSTANTS_FILE_PATH' below
@@ -44,31 +52,27 @@ if __name__ == "__main__":
     USE_RULE = run_dict['use_rule'] # using based rule action
     NUM_EP_TRAIN = run_dict['num_ep_run']
     TRAIN_FREQ = run_dict['train_freq']
+    SPREAD_TRAINING = run_dict['spread_training'] # also train after each episode, not only every TRAIN_FREQ episodes
     SUCCESS_RATE_THRESHOLD = run_dict['success_rate_threshold']
+    NUM_ENVS = run_dict['num_envs'] # number of environments run in lockstep in training
+    NUM_ACTORS = run_dict['num_actors'] # number of actor processes in training, 0 to train in this process only
+    WARMUP_CACHE_DIR = run_dict['warmup_cache'] # directory of the compiled warmup experiences, '' to run the warmup
 
-    # Load product DB
-    database= json.load(open(DATABASE_FILE_PATH, encoding='utf-8'))
-    # Load size DB
-    size_database= json.load(open(SIZE_DATABASE_FILE_PATH, encoding='utf-8'))
-
-    # Load product dict
-    db_dict = json.load(open(DICT_FILE_PATH, encoding='utf-8'))
-    # Load size dict
-    size_db_dict = json.load(open(SIZE_DICT_FILE_PATH, encoding='utf-8'))
-
-    # Load goal File
-    user_goals = json.load(open(USER_GOALS_FILE_PATH, encoding='utf-8'))
-
-    # Load dialogs File
-    dialogs = json.load(open(DIALOG_FILE_PATH, encoding='utf-8'))
+    # Load the product and size DBs (with their dicts) into columnar catalogs, the goals and the dialogs, from the
+    # snapshot compiled by snapshot.py if it is up to date with the files
+    database, size_database, user_goals, dialogs = load_data(file_path_dict)
 
     # Init. Objects
     if USE_USERSIM:
         user = UserSimulator(user_goals, constants, database, size_database)
 
-    emc = ErrorModelController(db_dict, size_db_dict, constants)
+    emc = ErrorModelController(database, size_database, constants)
     state_tracker = StateTracker(database, size_database, constants)
     dqn_agent = DQNAgent(state_tracker.get_state_size(), constants)
+    if NUM_ACTORS > 0:
+        actor_learner = ActorLearner(NUM_ACTORS, dqn_agent, user_goals, database, size_database, constants)
+    elif NUM_ENVS > 1:
+        vec_env = VecEnv(NUM_ENVS, user_goals, database, size_database, emc, constants)
 
 
 def episode_reset():
@@ -85,7 +89,8 @@ def episode_reset():
     user_action = user.reset_train()
     # Infuse with error
     emc.infuse_error(user_action)
-    DEBUG_PRINT("user:\t", user_action)
+    if _DEBUG:
+        DEBUG_PRINT("user:\t", user_action)
     SAVE_LOG("user:\t", user_action, filename='test.log')
     # And update state tracker
     state_tracker.update_state_user(user_action)
@@ -93,52 +98,27 @@ def episode_reset():
     dqn_agent.reset()
 
 
-def episode_reset_warmup(user_action=None, use_rule=False):
-    """
-    Resets the episode/conversation in the warmup.
-
-    Called in warmup to reset the state tracker, user and agent.
-
-    """
-
-    # First reset the state tracker
-    state_tracker.reset()
-    # Reset user
-    # user.reset()
-    if use_rule:
-        user_action = user.reset_warmup(use_rule)
-        # DEBUG_PRINT(user_action)
-        # Infuse with error
-        emc.infuse_error(user_action)
-    else:
-        user.reset_warmup()
-        user.pick_action(user_action)
-    # DEBUG_PRINT(user_action)
-    SAVE_LOG("user:\t", user_action, filename='warmup.log')
-    DEBUG_PRINT("user:\t", user_action)
-    # And update state tracker
-    state_tracker.update_state_user(user_action)
-    # Finally, reset agent
-    dqn_agent.reset()
-
-
 def run_round(state):
     # 1) Agent takes action given state tracker's representation of dialogue (state)
     agent_action_index, agent_action = dqn_agent.get_action_train(state)
-    DEBUG_PRINT("agent:\t", agent_action)
+    if _DEBUG:
+        DEBUG_PRINT("agent:\t", agent_action)
     # 2) Update state tracker with the agent's action
     state_tracker.update_state_agent_train(agent_action)
 
-    DEBUG_PRINT("agent:\t", agent_action)
+    if _DEBUG:
+        DEBUG_PRINT("agent:\t", agent_action)
     SAVE_LOG("agent:\t", agent_action, filename='test.log')
 
     # 3) User takes action given agent action
     user_action, reward, done, success = user.step(agent_action)
-    DEBUG_PRINT("user:\t", user_action)
+    if _DEBUG:
+        DEBUG_PRINT("user:\t", user_action)
     if not done:
         # 4) Infuse error into semantic frame level of user action
         emc.infuse_error(user_action)
-    DEBUG_PRINT("user (error):\t", user_action)
+    if _DEBUG:
+        DEBUG_PRINT("user (error):\t", user_action)
     SAVE_LOG("user (error):\t", user_action, filename='test.log')
     # 5) Update state tracker with user action
     state_tracker.update_state_user(user_action)
@@ -149,42 +129,6 @@ def run_round(state):
     return next_state, reward, done, success
 
 
-def run_round_warmup(state, agent_action=None, user_action=None, use_rule=False):
-    # 1) Agent takes action given state tracker's representation of dialogue (state)
-    if use_rule:
-        agent_action_index, agent_action = dqn_agent.get_action_warmup(state)
-    else:
-        # Pick an agent action in defined dialog
-        agent_action_index, agent_action = dqn_agent.pick_action(agent_action)
-    DEBUG_PRINT("agent:\t", agent_action)
-    # 2) Update state tracker with the agent's action
-    state_tracker.update_state_agent_warmup(agent_action, use_rule)
-    SAVE_LOG("agent:\t", agent_action, filename='warmup.log')
-    # DEBUG_PRINT("agent:\t", agent_action)
-    # 3) User takes action given agent action
-    if use_rule:
-        user_action, reward, done, success = user.step(agent_action)
-    else:
-        # Pick an user action in defined dialog
-        user_action, reward, done, success = user.pick_action(user_action, agent_action)
-    # DEBUG_PRINT("user:\t", user_action)
-    # DEBUG_PRINT("reward:\t", reward)
-    SAVE_LOG("reward:\t", reward, filename='warmup.log')
-    if not done:
-        # 4) Infuse error into semantic frame level of user action
-        emc.infuse_error(user_action)
-        # DEBUG_PRINT("user (error):\t", user_action)
-        SAVE_LOG("user (error):\t", user_action, filename='warmup.log')
-    DEBUG_PRINT("user:\t", user_action)
-    # 5) Update state tracker with user action
-    state_tracker.update_state_user(user_action)
-    # 6) Get next state and add experience
-    next_state = state_tracker.get_state(done)
-    dqn_agent.add_experience(state, agent_action_index, reward, next_state, done)
-
-    return next_state, reward, done, success
-
-
 def warmup_run():
     """
     Runs the warmup stage of training which is used to fill the agents memory.
@@ -195,38 +139,69 @@ def warmup_run():
     """
 
     print('Warmup Started...')
-    episode = 0
-    while episode != NUM_EP_WARMUP and not dqn_agent.is_memory_full():
-        SAVE_LOG("Start conversation!!!", filename='warmup.log')
-        if USE_RULE:
-            # Reset episode
-            episode_reset_warmup(use_rule=USE_RULE)
-            done = False
-            # Get initial state from state tracker
-            state = state_tracker.get_state()
-            while not done:
-                next_state, _, done, _ = run_round_warmup(state, use_rule=USE_RULE)
-                state = next_state
-            episode += 1
-        else:
-            if episode == len(dialogs):
-                episode = 0
-            dialog = dialogs[episode]
-            # Reset episode
-            episode_reset_warmup(dialog[0])
-            done = False
-            # Get initial state from state tracker
-            state = state_tracker.get_state()
-            i = 1
-            while not done:
-                next_state, _, done, _ = run_round_warmup(state=state, agent_action=dialog[i], user_action=dialog[i+1])
-                state = next_state
-                i += 2
-            episode += 1
-
+    if WARMUP_CACHE_DIR:
+        # Experiences of the warmup run once without error infused, see warmup_cache.py
+        num_experiences = load_warmup(dqn_agent, WARMUP_CACHE_DIR, constants, database, size_database, user_goals,
+                                      dialogs)
+        SAVE_LOG("warmup experiences loaded: ", num_experiences, filename='warmup.log')
+        print('...Warmup Ended')
+        return
+    run_warmup(dqn_agent, user, state_tracker, emc, NUM_EP_WARMUP, USE_RULE, dialogs)
     print('...Warmup Ended')
 
 
+def get_cache_stats():
+    """Returns the query cache statistics of the state trackers that run the training episodes."""
+
+    if NUM_ACTORS > 0:
+        return actor_learner.get_cache_stats()
+    if NUM_ENVS > 1:
+        return vec_env.get_cache_stats()
+    return state_tracker.db_helper.get_cache_stats()
+
+
+def end_train_period(episode, period_success_total, period_reward_total, success_rate_best):
+    """
+    Checks the success rate of the last TRAIN_FREQ episodes, then copies and trains the agent.
+
+    Parameters:
+        episode (int): The number of episodes so far
+        period_success_total (int): The number of successful episodes in the period
+        period_reward_total (int): The total reward of the episodes in the period
+        success_rate_best (float): The best success rate so far
+
+    Returns:
+        float: The best success rate so far, including this period
+    """
+
+    # Check success rate
+    success_rate = period_success_total / TRAIN_FREQ
+    avg_reward = period_reward_total / TRAIN_FREQ
+    if _DEBUG:
+        DEBUG_PRINT("episode: ", episode, ", success_rate = ", success_rate)
+    SAVE_LOG("episode: ", episode, ", success rate: ", success_rate, filename='train.log')
+    SAVE_LOG("episode: ", episode, ", db cache: ", get_cache_stats, filename='train.log')
+
+    # Flush
+    if success_rate >= success_rate_best and success_rate >= SUCCESS_RATE_THRESHOLD:
+        if _DEBUG:
+            DEBUG_PRINT("episode: ", episode, ", success_rate > threshold = ", success_rate)
+        dqn_agent.empty_memory()
+    # Update current best success rate
+    if success_rate > success_rate_best:
+        SAVE_LOG("Episode: ", episode, ", NEW BEST SUCCESS RATE: ", success_rate, ", Avg Reward: ", avg_reward, filename='train.log')
+        if _DEBUG:
+            DEBUG_PRINT("episode: ", episode, ", new best success_rate = ", success_rate)
+        success_rate_best = success_rate
+        dqn_agent.save_weights()
+    # Copy
+    dqn_agent.copy()
+    # Train
+    dqn_agent.train()
+    FLUSH_LOG()
+    return success_rate_best
+
+
 def train_run():
     """
     Runs the loop that trains the agent.
@@ -252,37 +227,105 @@ def train_run():
             next_state, reward, done, success = run_round(state)
             period_reward_total += reward
             state = next_state
-        DEBUG_PRINT("success: ", success)
+        if _DEBUG:
+            DEBUG_PRINT("success: ", success)
         # SAVE_LOG("success: ", success, ", reward total: ", period_reward_total, filename='train.log')
 
         period_success_total += success
 
         # Train
         if episode % TRAIN_FREQ == 0:
-            # Check success rate
-            success_rate = period_success_total / TRAIN_FREQ
-            avg_reward = period_reward_total / TRAIN_FREQ
-            DEBUG_PRINT("episode: ", episode, ", success_rate = ", success_rate)
-            SAVE_LOG("episode: ", episode, ", success rate: ", success_rate, filename='train.log')
-
-            # Flush
-            if success_rate >= success_rate_best and success_rate >= SUCCESS_RATE_THRESHOLD:
-                DEBUG_PRINT("episode: ", episode, ", success_rate > threshold = ", success_rate)
-                dqn_agent.empty_memory()
-            # Update current best success rate
-            if success_rate > success_rate_best:
-                SAVE_LOG("Episode: ", episode, ", NEW BEST SUCCESS RATE: ", success_rate, ", Avg Reward: ", avg_reward, filename='train.log')
-                DEBUG_PRINT("episode: ", episode, ", new best success_rate = ", success_rate)
-                success_rate_best = success_rate
-                dqn_agent.save_weights()
+            success_rate_best = end_train_period(episode, period_success_total, period_reward_total, success_rate_best)
             period_success_total = 0
             period_reward_total = 0
-            # Copy
-            dqn_agent.copy()
-            # Train
+        elif SPREAD_TRAINING:
             dqn_agent.train()
 
     print('...Training Ended')
 
-warmup_run()
-train_run()
\ No newline at end of file
+
+def train_run_vectorized():
+    """
+    Runs the loop that trains the agent with NUM_ENVS environments in lockstep.
+
+    Like train_run, but every round the agent picks the actions of all the environments with one batched forward
+    pass. An environment starts a new episode as soon as its episode ends, the episodes are counted as they end.
+
+    """
+
+    print('Training Started ({} environments)...'.format(NUM_ENVS))
+    episode = 0
+    period_reward_total = 0
+    period_success_total = 0
+    success_rate_best = 0
+
+    vec_env.reset()
+    while episode < NUM_EP_TRAIN:
+        for _, episode_reward, success in vec_env.step(dqn_agent):
+            episode += 1
+            if _DEBUG:
+                DEBUG_PRINT("success: ", success)
+            period_reward_total += episode_reward
+            period_success_total += success
+
+            # Train
+            if episode % TRAIN_FREQ == 0:
+                success_rate_best = end_train_period(episode, period_success_total, period_reward_total,
+                                                     success_rate_best)
+                period_success_total = 0
+                period_reward_total = 0
+            elif SPREAD_TRAINING:
+                dqn_agent.train()
+            if episode == NUM_EP_TRAIN:
+                break
+
+    print('...Training Ended')
+
+def train_run_distributed():
+    """
+    Runs the loop that trains the agent with NUM_ACTORS actor processes.
+
+    The actors run the episodes with copies of the behavior model and stream their experiences to this process, which
+    owns the memory and trains the agent like train_run. The new weights are broadcast to the actors after each
+    training, every TRAIN_FREQ episodes.
+
+    """
+
+    print('Training Started ({} actors)...'.format(NUM_ACTORS))
+    episode = 0
+    period_reward_total = 0
+    period_success_total = 0
+    success_rate_best = 0
+
+    actor_learner.start()
+    try:
+        for _, episode_reward, success in actor_learner.episodes():
+            episode += 1
+            period_reward_total += episode_reward
+            period_success_total += success
+
+            # Train
+            if episode % TRAIN_FREQ == 0:
+                success_rate_best = end_train_period(episode, period_success_total, period_reward_total,
+                                                     success_rate_best)
+                period_success_total = 0
+                period_reward_total = 0
+                actor_learner.broadcast_weights()
+            elif SPREAD_TRAINING:
+                dqn_agent.train()
+            if episode == NUM_EP_TRAIN:
+                break
+    finally:
+        actor_learner.stop()
+
+    print('...Training Ended')
+
+
+if __name__ == "__main__":
+    warmup_run()
+    if NUM_ACTORS > 0:
+        train_run_distributed()
+    elif NUM_ENVS > 1:
+        train_run_vectorized()
+    else:
+        train_run()
\ No newline at end of file
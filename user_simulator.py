@@ -1,10 +1,13 @@
 import random, copy, yaml, ast
 
-from utils import DEBUG_PRINT, SAVE_LOG
+from utils import DEBUG_PRINT, DEBUG_ENABLED, SAVE_LOG
 from utils import reward_function, check_match_sublist_and_substring
 from dialogue_config import FAIL, NO_OUTCOME, SUCCESS
 from dialogue_config import usersim_default_key, usersim_required_init_inform_keys, no_query_keys, request_product_entity, size_slots
 
+# Checked once, so the DEBUG_PRINT calls of this module cost nothing while it is off
+_DEBUG = DEBUG_ENABLED(__name__)
+
 class UserSimulator:
     """Simulates a real user, to train the agent with reinforcement learning."""
 
@@ -15,7 +18,8 @@ class UserSimulator:
         Parameters:
             goal_list (list): User goals loaded from file
             constants (dict): Dict of constants loaded from file
-            database (dict): The database in the format dict(long: dict)
+            database (list or Catalog): The database in the format list(dict)
+            size_database (list or Catalog): The size database in the format list(dict)
         """
 
         self.goal_list = goal_list
@@ -75,7 +79,8 @@ class UserSimulator:
 
         # First check round num, if equal to max then fail
         if agent_action and agent_action['round'] == self.max_round:
-            DEBUG_PRINT("max round reached")
+            if _DEBUG:
+                DEBUG_PRINT("max round reached")
             done = True
             success = FAIL
             user_response['intent'] = 'done'
@@ -142,7 +147,8 @@ class UserSimulator:
         """
 
         self.goal = random.choice(self.goal_list)
-        DEBUG_PRINT(self.goal)
+        if _DEBUG:
+            DEBUG_PRINT(self.goal)
         # Add default slot to requests of goal
         self.goal['request_slots'][self.default_key] = 'UNK'
         if self.goal['intent'] == 'request':
@@ -288,7 +294,8 @@ class UserSimulator:
         user_response['intent'] = self.state['intent']
         user_response['request_slots'] = copy.deepcopy(self.state['request_slots'])
         user_response['inform_slots'] = copy.deepcopy(self.state['inform_slots'])
-        DEBUG_PRINT(user_response)
+        if _DEBUG:
+            DEBUG_PRINT(user_response)
 
         reward = reward_function(success, self.max_round)
 
@@ -325,7 +332,8 @@ class UserSimulator:
             self.state['history_slots'][agent_request_key] = value_choice
             self.state['request_slots'].clear()
             assert agent_request_key not in self.state['rest_slots']
-            DEBUG_PRINT(self.state['inform_slots'])
+            if _DEBUG:
+                DEBUG_PRINT(self.state['inform_slots'])
         # Third Case: if the agent requests for something in the user sims goal request slots and it HASN'T been
         # informed, then request it with a random inform
         elif agent_request_key in self.goal['request_slots'] and agent_request_key in self.state['rest_slots']:
@@ -492,7 +500,8 @@ class UserSimulator:
         """
 
         if self.constraint_check == FAIL:
-            DEBUG_PRINT("fail constraint")
+            if _DEBUG:
+                DEBUG_PRINT("fail constraint")
             return FAIL
 
         if not self.state['rest_slots']:
@@ -502,7 +511,8 @@ class UserSimulator:
             #     if val == 'UNK':
             for key in list(self.state['rest_slots'].keys()):
                 if key not in self.size_slots:
-                    DEBUG_PRINT("fail remain slots, ", self.state['rest_slots'])
+                    if _DEBUG:
+                        DEBUG_PRINT("fail remain slots, ", self.state['rest_slots'])
                     return FAIL
 
         # TEMP: ----
@@ -1,5 +1,8 @@
-from inspect import getframeinfo, stack
+import atexit
 import os
+import sys
+
+from log_writer import LogWriter
 
 # from dialogue_config import FAIL, SUCCESS, UNSUITABLE, GOOD_INFORM, NO_VALUE
 from dialogue_config import FAIL, SUCCESS
@@ -9,17 +12,63 @@ TRAINLOG = True
 MODELLOG = False
 TESTLOG = False
 DEBUG = False
+# The debug level of the modules not in DEBUG_LEVELS, DEBUG_PRINT prints the messages of this level and below
+DEBUG_LEVEL = 1 if DEBUG else 0
+# Debug levels by module name (the name of a script run directly is __main__), e.g. {'db_query': 2}
+DEBUG_LEVELS = {}
+
+# Log lines are buffered and written out once LOG_BUFFER_SIZE characters are buffered or LOG_FLUSH_INTERVAL seconds
+# passed, by a background thread if LOG_THREAD
+LOG_BUFFER_SIZE = 1 << 16
+LOG_FLUSH_INTERVAL = 1.0
+LOG_THREAD = False
 
-def DEBUG_PRINT(*arg):
-    if DEBUG:
-        caller = getframeinfo(stack()[1][0])
-        filename = os.path.basename(caller.filename)
-        print("[%s][%s][%d]" % (filename, caller.function, caller.lineno), end =" ")
-        for message in arg:
-            print("%s" % (message), end ="") # python3 syntax print
-        print("")
+_log_writer = LogWriter(LOG_BUFFER_SIZE, LOG_FLUSH_INTERVAL, LOG_THREAD)
+atexit.register(_log_writer.close)
+
+def DEBUG_ENABLED(module, level=1):
+    """
+    Return True if DEBUG_PRINT prints the messages of the level from the module.
+
+    Hot modules check it once at import and skip their DEBUG_PRINT calls, and the evaluation of their arguments,
+    when it is False.
+
+    Parameters:
+        module (string): The module name
+        level (int)
+
+    Returns:
+        bool
+    """
+
+    return DEBUG_LEVELS.get(module, DEBUG_LEVEL) >= level
+
+def DEBUG_PRINT(*arg, level=1):
+    """
+    Prints the concatenated messages after the file, function and line of the caller, if the caller's module is on.
+
+    The messages are only formatted if the module is on, a callable message is called then and its result is printed.
+    """
+
+    if level > DEBUG_LEVEL and not DEBUG_LEVELS:
+        return
+    caller = sys._getframe(1)
+    if not DEBUG_ENABLED(caller.f_globals.get('__name__'), level):
+        return
+    code = caller.f_code
+    print("[%s][%s][%d]" % (os.path.basename(code.co_filename), code.co_name, caller.f_lineno), end =" ")
+    for message in arg:
+        print("%s" % (message() if callable(message) else message), end ="") # python3 syntax print
+    print("")
 
 def SAVE_LOG(*arg, filename='model.log'):
+    """
+    Appends the concatenated messages as a line to the log file, if the log of the file is on.
+
+    The messages are only formatted if the log is on, a callable message is called then and its result is logged.
+    The line is buffered, see FLUSH_LOG.
+    """
+
     if (filename == 'warmup.log' and WARMUPLOG == False) or \
     (filename == 'train.log' and TRAINLOG == False) or \
     (filename == 'test.log' and TESTLOG == False) or \
@@ -27,10 +76,14 @@ def SAVE_LOG(*arg, filename='model.log'):
         return
     string = ''
     for message in arg:
-        string += str(message)
+        string += str(message() if callable(message) else message)
     string += '\n'
-    with open(filename,'a') as f:
-        f.write(string)
+    _log_writer.write(filename, string)
+
+def FLUSH_LOG():
+    """Writes out the buffered lines of all log files."""
+
+    _log_writer.flush()
 
 def reward_function(success, max_round):
     """
@@ -0,0 +1,129 @@
+import numpy as np
+
+from utils import DEBUG_PRINT, DEBUG_ENABLED, SAVE_LOG
+from user_simulator import UserSimulator
+from state_tracker import StateTracker
+from db_query import merge_cache_stats
+
+# Checked once, so the DEBUG_PRINT calls of this module cost nothing while it is off
+_DEBUG = DEBUG_ENABLED(__name__)
+
+
+class VecEnv:
+    """Runs several independent user simulator and state tracker pairs in lockstep with batched agent actions."""
+
+    def __init__(self, num_envs, user_goals, database, size_database, emc, constants):
+        """
+        The constructor for VecEnv.
+
+        Parameters:
+            num_envs (int): The number of environments
+            user_goals (list): User goals loaded from file
+            database (list or Catalog): The database in the format list(dict)
+            size_database (list or Catalog): The size database in the format list(dict)
+            emc (ErrorModelController): Adds error to the user actions of all the environments
+            constants (dict): Loaded constants in dict
+        """
+
+        if num_envs < 1:
+            raise ValueError('Number of environments must be at least 1!')
+        self.num_envs = num_envs
+        self.users = [UserSimulator(user_goals, constants, database, size_database) for _ in range(num_envs)]
+        self.state_trackers = [StateTracker(database, size_database, constants) for _ in range(num_envs)]
+        self.emc = emc
+        self.state_size = self.state_trackers[0].get_state_size()
+        # The current and next state of each environment, the state trackers write into their rows
+        self.states = np.zeros((num_envs, self.state_size))
+        self.next_states = np.zeros((num_envs, self.state_size))
+        # The reward so far of the current episode of each environment
+        self.episode_rewards = np.zeros(num_envs)
+
+    def get_state_size(self):
+        """Returns the state size of the state representation used by the agent."""
+
+        return self.state_size
+
+    def get_cache_stats(self):
+        """
+        Returns the query cache statistics of the state trackers of all the environments added together.
+
+        Returns:
+            dict: The merged stats dict of each cache, see DBQuery.get_cache_stats
+        """
+
+        return merge_cache_stats([state_tracker.db_helper.get_cache_stats() for state_tracker in self.state_trackers])
+
+    def reset_env(self, i):
+        """
+        Resets the episode/conversation of an environment and writes its initial state into its row of states.
+
+        Parameters:
+            i (int): The index of the environment
+        """
+
+        state_tracker = self.state_trackers[i]
+        # First reset the state tracker
+        state_tracker.reset()
+        # Then pick an init user action
+        user_action = self.users[i].reset_train()
+        # Infuse with error
+        self.emc.infuse_error(user_action)
+        if _DEBUG:
+            DEBUG_PRINT("user:\t", user_action)
+        SAVE_LOG("user:\t", user_action, filename='test.log')
+        # And update state tracker
+        state_tracker.update_state_user(user_action)
+        state_tracker.get_state(out=self.states[i])
+        self.episode_rewards[i] = 0
+
+    def reset(self):
+        """Resets the episodes of all the environments."""
+
+        for i in range(self.num_envs):
+            self.reset_env(i)
+
+    def step(self, dqn_agent):
+        """
+        Runs one round in every environment and adds the experiences to the agent's memory.
+
+        The agent picks the actions of all the environments with one batched forward pass. The environments whose
+        episode is done are reset, so states always holds the current state of a running episode.
+
+        Parameters:
+            dqn_agent (DQNAgent)
+
+        Returns:
+            list: The (env index, episode reward, success) tuple of each episode that ended in this round
+        """
+
+        finished = []
+        # 1) Agent takes actions given the state trackers' representations of the dialogues
+        index_actions = dqn_agent.get_actions_train(self.states)
+        for i, (agent_action_index, agent_action) in enumerate(index_actions):
+            state_tracker = self.state_trackers[i]
+            # 2) Update state tracker with the agent's action
+            state_tracker.update_state_agent_train(agent_action)
+            if _DEBUG:
+                DEBUG_PRINT("agent:\t", agent_action)
+            SAVE_LOG("agent:\t", agent_action, filename='test.log')
+            # 3) User takes action given agent action
+            user_action, reward, done, success = self.users[i].step(agent_action)
+            if not done:
+                # 4) Infuse error into semantic frame level of user action
+                self.emc.infuse_error(user_action)
+            if _DEBUG:
+                DEBUG_PRINT("user (error):\t", user_action)
+            SAVE_LOG("user (error):\t", user_action, filename='test.log')
+            # 5) Update state tracker with user action
+            state_tracker.update_state_user(user_action)
+            # 6) Get next state and add experience
+            next_state = state_tracker.get_state(done, out=self.next_states[i])
+            dqn_agent.add_experience(self.states[i], agent_action_index, reward, next_state, done)
+            self.episode_rewards[i] += reward
+            if done:
+                finished.append((i, self.episode_rewards[i], success))
+
+        self.states, self.next_states = self.next_states, self.states
+        for i, _, _ in finished:
+            self.reset_env(i)
+        return finished
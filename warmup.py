@@ -3,12 +3,15 @@ import time
 import json
 import random
 
-from utils import DEBUG_PRINT, SAVE_LOG
+from utils import DEBUG_PRINT, DEBUG_ENABLED, SAVE_LOG
 from user_simulator import UserSimulator
 from error_model_controller import ErrorModelController
 from dqn_agent import DQNAgent
 from state_tracker import StateTracker
 
+# Checked once, so the DEBUG_PRINT calls of this module cost nothing while it is off
+_DEBUG = DEBUG_ENABLED(__name__)
+
 if __name__ == "__main__":
     # Can provide constants file path in args OR run it as is and change 'CONSTANTS_FILE_PATH' below
     # 1) In terminal: python train.py --constants_path "constants.json"
@@ -76,13 +79,15 @@ def episode_reset(self, user_action=None, use_rule=False):
     # user.reset()
     if use_rule:
         user_action = user.reset_warmup(use_rule)
-        DEBUG_PRINT(user_action)
+        if _DEBUG:
+            DEBUG_PRINT(user_action)
         # Infuse with error
         emc.infuse_error(user_action)
     else:
         user.reset_warmup()
         user.pick_action(user_action)
-    DEBUG_PRINT(user_action)
+    if _DEBUG:
+        DEBUG_PRINT(user_action)
     SAVE_LOG("user:\t", user_action, filename='warmup.log')
     # And update state tracker
     state_tracker.update_state_user(user_action)
@@ -97,7 +102,8 @@ def run_round(self, state, agent_action=None, user_action=None, use_rule=False):
     else:
         # Pick an agent action in defined dialog
         agent_action_index, agent_action = dqn_agent.pick_action(agent_action)
-    DEBUG_PRINT("agent:\t", agent_action)
+    if _DEBUG:
+        DEBUG_PRINT("agent:\t", agent_action)
     # 2) Update state tracker with the agent's action
     state_tracker.update_state_agent_warmup(agent_action, use_rule)
     SAVE_LOG("agent:\t", agent_action, filename='warmup.log')
@@ -107,8 +113,9 @@ def run_round(self, state, agent_action=None, user_action=None, use_rule=False):
     else:
         # Pick an user action in defined dialog
         user_action, reward, done, success = user.pick_action(user_action, agent_action)
-    DEBUG_PRINT("user:\t", user_action)
-    DEBUG_PRINT("reward:\t", reward)
+    if _DEBUG:
+        DEBUG_PRINT("user:\t", user_action)
+        DEBUG_PRINT("reward:\t", reward)
     SAVE_LOG("user:\t", user_action, filename='warmup.log')
     SAVE_LOG("reward:\t", reward, filename='warmup.log')
     if not done:
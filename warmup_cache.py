@@ -0,0 +1,127 @@
+import copy
+import hashlib
+import json
+import os
+import random
+import numpy as np
+
+from user_simulator import UserSimulator
+from state_tracker import StateTracker
+from dqn_agent import DQNAgent
+from warmup_loop import run_warmup
+
+# The warmup is compiled with this seed, so its episodes are the same for the same key
+WARMUP_SEED = 0
+# The file path constants of the data files the warmup depends on
+SOURCE_KEYS = ['database', 'size_database', 'dict', 'size_dict', 'user_goals', 'dialogs']
+# The source files whose code shapes the warmup transitions: the config, the user simulator (and its reward function
+# in utils), the state tracker and its DB queries, the rule based and random actions of the agent, the warmup loop and
+# this module
+SOURCE_FILES = ['dialogue_config.py', 'user_simulator.py', 'utils.py', 'state_tracker.py', 'db_query.py', 'catalog.py',
+                'dqn_agent.py', 'warmup_loop.py', 'warmup_cache.py']
+
+
+def warmup_cache_key(constants):
+    """
+    Returns the hash of everything the warmup transitions depend on.
+
+    That is the contents of the data files and of SOURCE_FILES, the constants the warmup reads and the seed.
+
+    Parameters:
+        constants (dict): Loaded constants in dict
+
+    Returns:
+        string
+    """
+
+    sha = hashlib.sha256()
+    for key in SOURCE_KEYS:
+        with open(constants['db_file_paths'][key], 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+    for file_name in SOURCE_FILES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+    run_dict = constants['run']
+    # epsilon_init is the chance of a random action in get_action_warmup
+    settings = {'num_ep_warmup': run_dict['num_ep_warmup'], 'use_rule': run_dict['use_rule'],
+                'max_round_num': run_dict['max_round_num'], 'max_mem_size': constants['agent']['max_mem_size'],
+                'epsilon_init': constants['agent']['epsilon_init'], 'seed': WARMUP_SEED}
+    sha.update(json.dumps(settings, sort_keys=True).encode('utf8'))
+    return sha.hexdigest()
+
+
+def compile_warmup(constants, database, size_database, user_goals, dialogs):
+    """
+    Runs the warmup loop of train.py without error infused into the user actions and returns its experiences.
+
+    The state of random and numpy.random is restored after, so the caller's episodes do not change.
+
+    Parameters:
+        constants (dict): Loaded constants in dict
+        database (Catalog): The database
+        size_database (Catalog): The size database
+        user_goals (list): User goals loaded from file
+        dialogs (list): The defined dialogs, used if not use_rule
+
+    Returns:
+        tuple: states, actions, rewards, next_states and dones arrays, in the order they were added
+    """
+
+    random_state, np_random_state = random.getstate(), np.random.get_state()
+    random.seed(WARMUP_SEED)
+    np.random.seed(WARMUP_SEED)
+    try:
+        # The warmup agent only uses its rule based policy and memory
+        warmup_constants = copy.deepcopy(constants)
+        warmup_constants['agent']['backend'] = 'numpy'
+        warmup_constants['agent']['graph_train_step'] = False
+        warmup_constants['agent']['load_weights_file_path'] = ''
+        user = UserSimulator(user_goals, warmup_constants, database, size_database)
+        state_tracker = StateTracker(database, size_database, warmup_constants)
+        dqn_agent = DQNAgent(state_tracker.get_state_size(), warmup_constants)
+        run_warmup(dqn_agent, user, state_tracker, None, constants['run']['num_ep_warmup'],
+                   constants['run']['use_rule'], dialogs)
+    finally:
+        random.setstate(random_state)
+        np.random.set_state(np_random_state)
+
+    memory = dqn_agent.memory
+    # Oldest first, the memory index is the oldest experience once the memory is full
+    order = np.roll(np.arange(len(memory)), -memory.index if memory.is_full() else 0)
+    return memory.get_batch(order)
+
+
+def load_warmup(dqn_agent, directory, constants, database, size_database, user_goals, dialogs):
+    """
+    Adds the warmup experiences to the agent's memory in one call, compiling them into the cache directory first if
+    they are not there for the current key.
+
+    Parameters:
+        dqn_agent (DQNAgent)
+        directory (string): The cache directory, created if needed
+        constants (dict): Loaded constants in dict
+        database (Catalog): The database
+        size_database (Catalog): The size database
+        user_goals (list): User goals loaded from file
+        dialogs (list): The defined dialogs
+
+    Returns:
+        int: The number of experiences added
+    """
+
+    file_path = os.path.join(directory, 'warmup_{}.npz'.format(warmup_cache_key(constants)))
+    if os.path.exists(file_path):
+        with np.load(file_path) as f:
+            experiences = (f['states'], f['actions'], f['rewards'], f['next_states'], f['dones'])
+    else:
+        experiences = compile_warmup(constants, database, size_database, user_goals, dialogs)
+        os.makedirs(directory, exist_ok=True)
+        # Written under another name first, so an interrupted write is never loaded
+        temp_path = file_path + '.tmp.npz'
+        np.savez(temp_path, states=experiences[0], actions=experiences[1], rewards=experiences[2],
+                 next_states=experiences[3], dones=experiences[4])
+        os.replace(temp_path, file_path)
+    dqn_agent.add_experiences(*experiences)
+    return len(experiences[1])
@@ -0,0 +1,137 @@
+from utils import DEBUG_PRINT, DEBUG_ENABLED, SAVE_LOG
+
+# Checked once, so the DEBUG_PRINT calls of this module cost nothing while it is off
+_DEBUG = DEBUG_ENABLED(__name__)
+
+
+def episode_reset_warmup(dqn_agent, user, state_tracker, emc, user_action=None, use_rule=False):
+    """
+    Resets the episode/conversation in the warmup.
+
+    Called in warmup to reset the state tracker, user and agent.
+
+    Parameters:
+        dqn_agent (DQNAgent)
+        user (UserSimulator)
+        state_tracker (StateTracker)
+        emc (ErrorModelController): None to not infuse error
+        user_action (dict): The first user action of the dialog, used if not use_rule
+        use_rule (bool)
+    """
+
+    # First reset the state tracker
+    state_tracker.reset()
+    # Reset user
+    if use_rule:
+        user_action = user.reset_warmup(use_rule)
+        # Infuse with error
+        if emc is not None:
+            emc.infuse_error(user_action)
+    else:
+        user.reset_warmup()
+        user.pick_action(user_action)
+    SAVE_LOG("user:\t", user_action, filename='warmup.log')
+    if _DEBUG:
+        DEBUG_PRINT("user:\t", user_action)
+    # And update state tracker
+    state_tracker.update_state_user(user_action)
+    # Finally, reset agent
+    dqn_agent.reset()
+
+
+def run_round_warmup(dqn_agent, user, state_tracker, emc, state, agent_action=None, user_action=None,
+                     use_rule=False):
+    """
+    Runs a round of the warmup and adds its experience to the agent's memory.
+
+    Parameters:
+        dqn_agent (DQNAgent)
+        user (UserSimulator)
+        state_tracker (StateTracker)
+        emc (ErrorModelController): None to not infuse error
+        state (numpy.array)
+        agent_action (dict): The agent action of the dialog, used if not use_rule
+        user_action (dict): The user action of the dialog, used if not use_rule
+        use_rule (bool)
+
+    Returns:
+        tuple: The next state, reward, done and success
+    """
+
+    # 1) Agent takes action given state tracker's representation of dialogue (state)
+    if use_rule:
+        agent_action_index, agent_action = dqn_agent.get_action_warmup(state)
+    else:
+        # Pick an agent action in defined dialog
+        agent_action_index, agent_action = dqn_agent.pick_action(agent_action)
+    if _DEBUG:
+        DEBUG_PRINT("agent:\t", agent_action)
+    # 2) Update state tracker with the agent's action
+    state_tracker.update_state_agent_warmup(agent_action, use_rule)
+    SAVE_LOG("agent:\t", agent_action, filename='warmup.log')
+    # 3) User takes action given agent action
+    if use_rule:
+        user_action, reward, done, success = user.step(agent_action)
+    else:
+        # Pick an user action in defined dialog
+        user_action, reward, done, success = user.pick_action(user_action, agent_action)
+    SAVE_LOG("reward:\t", reward, filename='warmup.log')
+    if not done and emc is not None:
+        # 4) Infuse error into semantic frame level of user action
+        emc.infuse_error(user_action)
+        SAVE_LOG("user (error):\t", user_action, filename='warmup.log')
+    if _DEBUG:
+        DEBUG_PRINT("user:\t", user_action)
+    # 5) Update state tracker with user action
+    state_tracker.update_state_user(user_action)
+    # 6) Get next state and add experience
+    next_state = state_tracker.get_state(done)
+    dqn_agent.add_experience(state, agent_action_index, reward, next_state, done)
+
+    return next_state, reward, done, success
+
+
+def run_warmup(dqn_agent, user, state_tracker, emc, num_ep_warmup, use_rule, dialogs):
+    """
+    Runs the warmup episodes, which fill the agent's memory.
+
+    The agent uses it's rule-based policy, or the defined dialogs if not use_rule, to make actions. Loop terminates
+    after num_ep_warmup episodes or when the memory buffer is full. Used by train.py and to compile the warmup cache,
+    see warmup_cache.py.
+
+    Parameters:
+        dqn_agent (DQNAgent)
+        user (UserSimulator)
+        state_tracker (StateTracker)
+        emc (ErrorModelController): None to not infuse error into the user actions
+        num_ep_warmup (int)
+        use_rule (bool)
+        dialogs (list): The defined dialogs, used if not use_rule
+    """
+
+    episode = 0
+    while episode != num_ep_warmup and not dqn_agent.is_memory_full():
+        SAVE_LOG("Start conversation!!!", filename='warmup.log')
+        if use_rule:
+            # Reset episode
+            episode_reset_warmup(dqn_agent, user, state_tracker, emc, use_rule=use_rule)
+            done = False
+            # Get initial state from state tracker
+            state = state_tracker.get_state()
+            while not done:
+                state, _, done, _ = run_round_warmup(dqn_agent, user, state_tracker, emc, state, use_rule=use_rule)
+        else:
+            if episode == len(dialogs):
+                episode = 0
+            dialog = dialogs[episode]
+            # Reset episode
+            episode_reset_warmup(dqn_agent, user, state_tracker, emc, dialog[0])
+            done = False
+            # Get initial state from state tracker
+            state = state_tracker.get_state()
+            i = 1
+            while not done:
+                state, _, done, _ = run_round_warmup(dqn_agent, user, state_tracker, emc, state,
+                                                     agent_action=dialog[i], user_action=dialog[i + 1])
+                i += 2
+        episode += 1